@@ -0,0 +1,106 @@
+import time
+import uasyncio as asyncio
+import logger as log
+import memory
+
+
+class Admission:
+    """Admission control for the web server.
+
+    Limits concurrent HTTP requests and SSE subscribers, enforces read and
+    write deadlines so half-open sockets are dropped, and lets UI traffic
+    back off while footswitch commands are being handled.
+    """
+
+    def __init__(self, cfg: dict):
+        # Every request holds a pooled buffer, so the pool caps the limit
+        self.max_http = min(cfg.get("http_max_connections", 3), memory.HTTP_POOL_SIZE)
+        self.max_sse = cfg.get("sse_max_clients", 4)
+        self.read_timeout_ms = cfg.get("http_read_timeout_ms", 2000)
+        self.write_timeout_ms = cfg.get("sse_write_timeout_ms", 1000)
+        self.command_quiet_ms = cfg.get("command_quiet_ms", 50)
+
+        self.http_active = 0
+        self.sse_clients = []
+        self.rejected_http = 0
+        self.evicted_sse = 0
+        self.timeouts = 0
+        self._last_command = time.ticks_add(time.ticks_ms(), -self.command_quiet_ms)
+
+    # ---------- HTTP ----------
+
+    def try_enter(self) -> bool:
+        if self.http_active >= self.max_http:
+            self.rejected_http += 1
+            log.warning("HTTP rejected, active:", self.http_active)
+            return False
+        self.http_active += 1
+        return True
+
+    def leave(self):
+        self.http_active -= 1
+
+    async def read(self, awaitable):
+        """Await a read with the per-connection deadline."""
+        try:
+            return await asyncio.wait_for_ms(awaitable, self.read_timeout_ms)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    # ---------- SSE ----------
+
+    def add_sse(self, writer):
+        """Subscribe writer, evicting the oldest subscriber when full.
+
+        Phones that reconnect in a loop leave dead subscribers behind, the
+        newest connection is the one most likely to still be alive.
+        """
+        if len(self.sse_clients) >= self.max_sse:
+            oldest = self.sse_clients.pop(0)
+            self.evicted_sse += 1
+            log.info("SSE subscriber evicted")
+            asyncio.create_task(self._close(oldest))
+        self.sse_clients.append(writer)
+
+    def remove_sse(self, writer):
+        if writer in self.sse_clients:
+            self.sse_clients.remove(writer)
+            asyncio.create_task(self._close(writer))
+
+    async def write_sse(self, writer, msg) -> bool:
+        """Write msg with the write deadline, False if the client is gone."""
+        try:
+            await asyncio.wait_for_ms(writer.awrite(msg), self.write_timeout_ms)
+            return True
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return False
+        except Exception:
+            return False
+
+    async def _close(self, writer):
+        try:
+            await writer.aclose()
+        except Exception:
+            pass
+
+    # ---------- Command priority ----------
+
+    def note_command(self):
+        self._last_command = time.ticks_ms()
+
+    async def yield_to_commands(self):
+        """Hold UI work back until commands have been quiet for a moment."""
+        while time.ticks_diff(time.ticks_ms(), self._last_command) < self.command_quiet_ms:
+            await asyncio.sleep_ms(self.command_quiet_ms)
+
+    def render(self) -> str:
+        """Admission report appended to the /metrics output."""
+        return (
+            f"http_active_connections {self.http_active}\n"
+            f"http_rejected_total {self.rejected_http}\n"
+            f"sse_clients {len(self.sse_clients)}\n"
+            f"sse_evicted_total {self.evicted_sse}\n"
+            f"connection_timeouts_total {self.timeouts}\n"
+        )
@@ -1,31 +1,63 @@
 import uasyncio as asyncio
 import network
 import socket
-import json
-from typing import Optional
+try:
+    from typing import Optional
+except ImportError:
+    pass
 import time
 from patch import Patch
+from sequencer import Sequencer
+from sync import CatalogSync
 from bank_manager import BankManager
+from bank_cache import BankCache
+from admission import Admission
 from file import Html, Json
+from http_parser import HttpError, read_body, read_request, send_response
+import logger as log
+import memory
+import metrics
+import transport
 
 UDP_PORT = 5005
+UDP_MAX_PACKET = 16
 
 
 class AsyncWebServer:
     def __init__(self, config_file="network_config.json"):
         config = Json(config_file).data
+        log.set_level(config.get("log_level", "off"))
+        metrics.enable(config.get("metrics", False))
+
         self.access_point = config.get("access_point", False)
         
         # Check communication mode from network config
         # Can be "wifi", "ble", or "both"
         self.comm_mode = config.get("communication_mode", "wifi")
         
-        print(f"Communication mode: {self.comm_mode}")
+        log.info("Communication mode:", self.comm_mode)
 
         self.webPage = WebPage()
         self.bankManager = BankManager()
         self.current_patch: Optional[Patch] = self.bankManager.get_active_patch()
-        self.sse_clients = set()
+        self.catalogSync = CatalogSync(self.bankManager)
+        self.bankCache = BankCache(self.bankManager, config.get("bank_cache_neighbours", -1))
+        self.bankCache.preload()
+        # Last rendered page and the patch view it was rendered from
+        self._page = None
+        self._page_view = None
+        self.sequencer = Sequencer(self.bankManager, on_step=self.refresh_display)
+        self.admission = Admission(config)
+        self.dedup = transport.Deduplicator()
+
+        # Ring of recorded commands on flash, for replay with tools/replay.py
+        self.recorder = None
+        if config.get("record_commands", 0):
+            from recorder import Recorder
+            self.recorder = Recorder(config["record_commands"])
+        self.sse_clients = self.admission.sse_clients
+        self.build_routes()
+        memory.configure(config)
         
         self.ble_server = None
         self.udp_sock = None
@@ -45,13 +77,13 @@ class AsyncWebServer:
                 self.wlan = self.connect(config)
                 self.ip = self.wlan.ifconfig()[0]
 
-            print("Network ready, IP:", self.ip)
+            log.info("Network ready, IP:", self.ip)
 
             # ---------- UDP ----------
             self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.udp_sock.bind(("0.0.0.0", UDP_PORT))
             self.udp_sock.setblocking(False)
-            print("UDP listening on", UDP_PORT)
+            log.info("UDP listening on", UDP_PORT)
             self.wifi_enabled = True
             
         if enable_ble:
@@ -63,11 +95,29 @@ class AsyncWebServer:
             )
             if not enable_wifi:
                 self.ip = "BLE Mode"
-            print("BLE server ready")
+            log.info("BLE server ready")
             self.ble_enabled = True
         
+        # ---------- LCD ----------
+        self.display = None
+        lcd_config = self.bankManager.file.data.get("lcd")
+        if lcd_config:
+            from display import Display
+            self.display = Display(lcd_config, self.bankManager)
+
+        # ---------- Expression pedals ----------
+        self.expression = None
+        expression_config = self.bankManager.file.data.get("expression")
+        if expression_config:
+            from pins import reserved_pins
+            from expression import ExpressionPedals
+            bm = self.bankManager
+            # Stops the boot on an input pin that other hardware uses
+            reserved_pins(bm.file.data)
+            self.expression = ExpressionPedals(expression_config, bm.midi, lambda: bm.applied_patch)
+
         if enable_wifi and enable_ble:
-            print(f"Both WiFi and BLE enabled - accepting commands from both!")
+            log.info("Both WiFi and BLE enabled - accepting commands from both!")
 
     # =====================================================
     # NETWORK
@@ -89,7 +139,7 @@ class AsyncWebServer:
         while not wlan.isconnected():
             pass
 
-        print("Connected:", wlan.ifconfig())
+        log.info("Connected:", wlan.ifconfig())
         return wlan
 
     def access_point_setup(self, cfg):
@@ -118,15 +168,15 @@ class AsyncWebServer:
         # supported keys or set keys individually and ignore unsupported ones.
         try:
             ap.config(**params)
-            print("AP config applied:", params)
+            log.info("AP config applied:", params)
         except ValueError as e:
-            print("ap.config rejected some params, retrying individually:", e)
+            log.warning("ap.config rejected some params, retrying individually:", e)
             for k, v in params.items():
                 try:
                     ap.config(**{k: v})
-                    print(f"  ✓ {k}={v}")
+                    log.info(f"  ✓ {k}={v}")
                 except Exception as ex:
-                    print(f"  ✗ {k}={v} (not supported: {ex})")
+                    log.warning(f"  ✗ {k}={v} (not supported: {ex})")
 
         # Wait until AP is fully active
         timeout = 10
@@ -137,7 +187,7 @@ class AsyncWebServer:
         if not ap.active():
             raise RuntimeError("AP failed to start")
 
-        print("AP ready:", ap.ifconfig())
+        log.info("AP ready:", ap.ifconfig())
         return ap
 
     # =====================================================
@@ -149,43 +199,121 @@ class AsyncWebServer:
         if not self.wifi_enabled or self.udp_sock is None:
             return
             
-        print("UDP listener task started")
+        log.info("UDP listener task started")
         check_count = 0
         while True:
             try:
-                data, addr = self.udp_sock.recvfrom(8)
-                print(f"UDP received {len(data)} bytes from {addr}: {data.hex()}")
-                self.handle_command_packet(data)
-            except OSError as e:
+                # recvfrom() rather than readinto(): sync replies need the sender
+                data, addr = self.udp_sock.recvfrom(UDP_MAX_PACKET)
+            except OSError:
+                data = None
+
+            if data:
+                log.debug("UDP received", data, "from", addr)
+                try:
+                    self.handle_command_packet(data, self.udp_reply(addr), addr)
+                except Exception as e:
+                    # A bad packet must not take the listener down with it
+                    log.error("UDP command failed:", e)
+            else:
                 # No data available, continue
                 check_count += 1
                 if check_count % 1000 == 0:
-                    print(f"UDP listener alive (checked {check_count} times, no data)")
+                    log.debug("UDP listener alive, checked", check_count, "times, no data")
                 await asyncio.sleep_ms(5)
 
-    def handle_command_packet(self, data: bytes):
-        """Handle command packet from either UDP or BLE"""
+    def udp_reply(self, addr):
+        def reply(message: bytes):
+            self.udp_sock.sendto(message, addr)
+        return reply
+
+    def handle_command_packet(self, data: bytes, reply=None, peer=None):
+        """Handle command packet from either UDP or BLE
+
+        reply(bytes) answers the sender, it is None for sources that cannot
+        be answered.
+        """
         if len(data) < 1:
-            print("Empty packet received")
+            log.warning("Empty packet received")
             return
 
+        # Catalog sync with the FootProxy is not a footswitch command
+        if reply is not None and self.catalogSync.handle(data, reply, peer):
+            return
+
+        if self.recorder:
+            source = self.recorder.SOURCE_BLE if peer == "ble" else self.recorder.SOURCE_UDP
+            self.recorder.record(source, data)
+
+        frame = transport.parse(data)
+        if frame is None:
+            self.execute_command(data)
+            return
+
+        session, seq, command = frame
+        if self.dedup.accept(peer, session, seq):
+            status = transport.ACK_OK if self.execute_command(command) else transport.ACK_ERROR
+        else:
+            status = transport.ACK_DUPLICATE
+        if reply is not None:
+            bm = self.bankManager
+            # Position in the active bank, not the last patch picked in any bank
+            bank = bm.get_active_bank()
+            patch_index = bank.active_index if bank and bank.active_index >= 0 else transport.NO_PATCH
+            reply(transport.ack(session, seq, status, bm.get_active_bank_index(), patch_index))
+
+    def execute_command(self, data) -> bool:
+        """Run one footswitch command, returns False if it is not valid."""
+        t0 = metrics.start()
+        self.admission.note_command()
         cmd = data[0]
-        print(f"Processing command 0x{cmd:02x}")
+        log.debug("Processing command", cmd)
+
+        # Any manual bank/patch/sequence command takes over from a running sequence
+        if cmd in (0x01, 0x02, 0x03, 0x06):
+            self.sequencer.cancel()
 
         if cmd == 0x01:
-            print("CMD: BANK UP")
-            self.bankManager.move_up_bank()
+            log.info("CMD: BANK UP")
+            with memory.critical():
+                self.bankManager.move_up_bank()
+            self.bankCache.prefetch()
 
         elif cmd == 0x02:
-            print("CMD: BANK DOWN")
-            self.bankManager.move_down_bank()
+            log.info("CMD: BANK DOWN")
+            with memory.critical():
+                self.bankManager.move_down_bank()
+            self.bankCache.prefetch()
 
         elif cmd == 0x03 and len(data) >= 2:
             patch_idx = data[1]
-            print("CMD: PATCH", patch_idx)
-            self.current_patch = self.bankManager.select_patch(patch_idx)
+            log.info("CMD: PATCH", patch_idx)
+            with memory.critical():
+                self.current_patch = self.bankManager.select_patch(patch_idx)
+
+        elif cmd == 0x04:
+            log.info("CMD: TAP TEMPO")
+            self.bankManager.clock.tap()
+
+        elif cmd == 0x05:
+            log.info("CMD: CLOCK START/STOP")
+            self.bankManager.clock.toggle()
+
+        elif cmd == 0x06 and len(data) >= 2:
+            log.info("CMD: SEQUENCE", data[1])
+            self.sequencer.trigger(data[1])
         else:
-            print(f"Unknown command or insufficient data: {data.hex()}")
+            log.warning("Unknown command or insufficient data:", data)
+            return False
+
+        metrics.inc(metrics.COMMANDS)
+        metrics.stop(metrics.COMMAND, t0)
+        self.refresh_display()
+        return True
+
+    def refresh_display(self):
+        if self.display:
+            self.display.refresh()
 
     # Deprecated: old UDP-specific handler - kept for compatibility
     def handle_udp_packet(self, data: bytes):
@@ -196,137 +324,222 @@ class AsyncWebServer:
     # SSE BROADCAST (TEXT ONLY)
     # =====================================================
 
+    def current_view(self):
+        """Prepared view of the active bank."""
+        bm = self.bankManager
+        bank = bm.get_active_bank()
+        if bank is None:
+            self.current_patch = None
+            return self.bankCache.idle()
+        self.current_patch = bank.get_active_patch()
+        return self.bankCache.get(bm.get_active_bank_index())
+
+    def current_patch_index(self) -> int:
+        """Position of the active patch in its bank, -1 when none is active."""
+        bank = self.bankManager.get_active_bank()
+        return bank.active_index if bank else -1
+
     async def broadcast(self):
+        clients = self.sse_clients
         while True:
-            if not self.sse_clients:
-                await asyncio.sleep(0.5)
+            if not clients:
+                await asyncio.sleep_ms(500)
                 continue
 
             # Always get the current active patch to stay in sync
-            patch = self.bankManager.get_active_patch()
-            self.current_patch = patch
-
-            # Build lists of active indices instead of CSS classes
-            active_loops = []
-            active_switches = []
-
-            if patch:
-                loops = patch.get_loops()
-                for i, loop in enumerate(loops, 1):
-                    if loop.active:
-                        active_loops.append(i)
-
-                switches = patch.footSwitch.get_footswitch()
-                for i, sw in enumerate(switches, 1):
-                    if sw.active:
-                        active_switches.append(i)
-            
-            payload = {
-                "bank": self.bankManager.get_active_bank_name(),
-                "bank_index": self.bankManager.get_active_bank_index(),
-                "patch_index": self.bankManager.get_active_patch_index(),
-                "midi_presets": patch.get_midi_list() if patch else [],
-                "active_loops": active_loops,
-                "active_switches": active_switches,
-                "patch_names": self.bankManager.get_patch_names()
-            }
-
-            msg = f"data: {json.dumps(payload)}\n\n"
-
-            dead = set()
-            for client in list(self.sse_clients):
-                try:
-                    await client.awrite(msg)
-                except Exception:
-                    dead.add(client)
-
-            self.sse_clients -= dead
-            await asyncio.sleep(0.5)
+            msg = self.current_view().sse(self.current_patch_index())
+
+            # Let a burst of footswitch commands finish before UI traffic
+            await self.admission.yield_to_commands()
+
+            t0 = metrics.start()
+            # Walk the live list instead of a copy: a dead client is removed
+            # in place and the next one moves into its slot
+            i = 0
+            while i < len(clients):
+                client = clients[i]
+                if await self.admission.write_sse(client, msg):
+                    i += 1
+                else:
+                    self.admission.remove_sse(client)
+
+            metrics.stop(metrics.SSE_FANOUT, t0)
+            metrics.inc(metrics.SSE_MESSAGES, len(clients))
+            await asyncio.sleep_ms(500)
 
     # =====================================================
     # HTTP SERVER
     # =====================================================
 
+    def build_routes(self):
+        """Router table: (method, path) -> handler(request, writer).
+
+        HEAD is served by the GET handler with request.head set.
+        """
+        self.routes = {
+            ("GET", "/"): self.handle_page,
+            ("POST", "/"): self.handle_post,
+            ("GET", "/events"): self.handle_events,
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+        self.route_paths = set(path for _, path in self.routes)
+
     async def serve_client(self, reader, writer):
+        if not self.admission.try_enter():
+            try:
+                await asyncio.wait_for_ms(
+                    send_response(writer, 503, headers="Retry-After: 1\r\n"),
+                    self.admission.write_timeout_ms
+                )
+            except Exception:
+                pass
+            finally:
+                try:
+                    await writer.aclose()
+                except:
+                    pass
+            return
+
+        buf = memory.acquire_http_buf()
+        keep_open = False
+        request = None
         try:
-            request = await reader.readline()
-            if not request:
-                await writer.aclose()
+            request = await self.admission.read(read_request(reader, buf))
+            if request is None:
                 return
 
-            method, path, *_ = request.decode().split()
-
-            headers = {}
-            while True:
-                line = await reader.readline()
-                if line in (b"\r\n", b""):
-                    break
-                k, v = line.decode().split(":", 1)
-                headers[k.lower()] = v.strip()
-
-            # ---------- SSE ----------
-            if method == "GET" and path == "/events":
-                await writer.awrite(
-                    "HTTP/1.1 200 OK\r\n"
-                    "Content-Type: text/event-stream\r\n"
-                    "Cache-Control: no-cache\r\n"
-                    "Connection: keep-alive\r\n\r\n"
-                )
-                self.sse_clients.add(writer)
-                return
+            method = request.method
+            if method == "HEAD":
+                request.head = True
+                method = "GET"
 
-            # ---------- POST ----------
-            if method == "POST":
-                length = int(headers.get("content-length", 0))
-                body = await reader.read(length)
-                data = body.decode()
-                print(f"POST received: {data}")
-
-                # Parse application/x-www-form-urlencoded
-                for pair in data.split("&"):
-                    pair = pair.strip()
-                    if pair:
-                        print(f"Processing: {pair}")
-                        self.current_patch = self.switch(pair)
-
-                await writer.awrite(
-                    "HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nOK"
-                )
-                await writer.aclose()
+            handler = self.routes.get((method, request.path))
+            if handler is None:
+                status = 405 if request.path in self.route_paths else 404
+                await send_response(writer, status, head=request.head)
                 return
 
-            # ---------- HTML ----------
-            html = self.webPage.render(
-                self.bankManager.get_html_context(self.current_patch)
-            )
-
-            await writer.awrite(
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: text/html\r\n"
-                f"Content-Length: {len(html)}\r\n\r\n{html}"
-            )
-            await writer.aclose()
+            keep_open = await handler(request, writer, reader, buf)
 
-        except Exception as e:
-            print("HTTP error:", e)
+        except HttpError as e:
+            log.warning("HTTP", e.status)
             try:
-                await writer.aclose()
-            except:
+                await send_response(writer, e.status, head=request is not None and request.head)
+            except Exception:
                 pass
+        except asyncio.TimeoutError:
+            log.warning("HTTP read timeout")
+            try:
+                await send_response(writer, 408, head=request is not None and request.head)
+            except Exception:
+                pass
+        except Exception as e:
+            log.error("HTTP error:", e)
+        finally:
+            memory.release_http_buf(buf)
+            self.admission.leave()
+            if not keep_open:
+                try:
+                    await writer.aclose()
+                except:
+                    pass
+
+    # ---------- SSE ----------
+    async def handle_events(self, request, writer, reader, buf) -> bool:
+        await writer.awrite(
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        if request.head:
+            return False
+        self.admission.add_sse(writer)
+        return True
+
+    # ---------- METRICS ----------
+    async def handle_metrics(self, request, writer, reader, buf) -> bool:
+        await self.admission.yield_to_commands()
+        body = metrics.render() + memory.render() + self.admission.render() + self.bankCache.render() + self.dedup.render()
+        if self.expression:
+            body += self.expression.render()
+        if self.recorder:
+            body += self.recorder.render()
+        await send_response(writer, 200, body, "text/plain; version=0.0.4", request.head)
+        return False
+
+    # ---------- POST ----------
+    async def handle_post(self, request, writer, reader, buf) -> bool:
+        # An explicit Content-Length: 0 is an empty form, only a missing one is refused
+        if not request.chunked and request.content_length < 0:
+            await send_response(writer, 411)
+            return False
+
+        body = await self.admission.read(read_body(reader, writer, request, buf))
+        data = bytes(body).decode()
+        log.debug("POST received:", data)
+
+        # Parse application/x-www-form-urlencoded
+        try:
+            for pair in data.split("&"):
+                pair = pair.strip()
+                if pair:
+                    log.debug("Processing:", pair)
+                    if self.recorder:
+                        self.recorder.record(self.recorder.SOURCE_HTTP, pair.encode())
+                    t0 = metrics.start()
+                    self.current_patch = self.switch(pair)
+                    metrics.inc(metrics.COMMANDS)
+                    metrics.stop(metrics.COMMAND, t0)
+        except ValueError:
+            # patch= or sequence= without a number
+            raise HttpError(400)
+        finally:
+            self.refresh_display()
+
+        await send_response(writer, 200, b"OK")
+        return False
+
+    # ---------- HTML ----------
+    async def handle_page(self, request, writer, reader, buf) -> bool:
+        await self.admission.yield_to_commands()
+        patch_view = self.current_view().get_patch(self.current_patch_index())
+        # Reloads of the same patch reuse the page rendered last time
+        if self._page is None or patch_view is not self._page_view:
+            self._page = self.webPage.render(patch_view.html_context if patch_view else {})
+            self._page_view = patch_view
+        html = self._page
+        await send_response(writer, 200, html, "text/html; charset=utf-8", request.head)
+        return False
 
     # =====================================================
     # SWITCH FROM HTTP
     # =====================================================
 
     def switch(self, cmd: str):
+        self.admission.note_command()
+        if cmd.startswith("bank=") or cmd.startswith("patch=") or cmd.startswith("sequence="):
+            self.sequencer.cancel()
+
         if cmd == "bank=up":
-            self.bankManager.move_up_bank()
+            with memory.critical():
+                self.bankManager.move_up_bank()
+            self.bankCache.prefetch()
         elif cmd == "bank=down":
-            self.bankManager.move_down_bank()
+            with memory.critical():
+                self.bankManager.move_down_bank()
+            self.bankCache.prefetch()
+        elif cmd == "tap=1":
+            self.bankManager.clock.tap()
+        elif cmd == "clock=toggle":
+            self.bankManager.clock.toggle()
+        elif cmd.startswith("sequence="):
+            self.sequencer.trigger(int(cmd.split("=")[1]) - 1)
         elif cmd.startswith("patch="):
             idx = int(cmd.split("=")[1]) - 1
-            print(f"Selecting patch {idx}")
-            return self.bankManager.select_patch(idx)
+            log.info("Selecting patch", idx)
+            with memory.critical():
+                return self.bankManager.select_patch(idx)
 
         return self.bankManager.get_active_patch()
 
@@ -335,20 +548,40 @@ class AsyncWebServer:
     # =====================================================
 
     async def run(self):
-        print("Starting web server on port 80...")
+        log.info("Starting web server on port 80...")
         await asyncio.start_server(self.serve_client, "0.0.0.0", 80)
-        print("Web server started")
+        log.info("Web server started")
         
-        print("Creating broadcast task...")
+        self.bankCache.prefetch()
+
+        log.debug("Creating broadcast task...")
         asyncio.create_task(self.broadcast())
         
-        print("Creating UDP listener task...")
+        log.debug("Creating UDP listener task...")
         asyncio.create_task(self.udp_listener())
+
+        log.debug("Creating idle GC task...")
+        asyncio.create_task(memory.idle_collector())
+
+        if self.display:
+            log.debug("Creating display task...")
+            asyncio.create_task(self.display.run())
+
+        if self.expression:
+            log.debug("Creating expression pedal task...")
+            asyncio.create_task(self.expression.run())
+
+        if self.recorder:
+            log.debug("Creating command recorder task...")
+            asyncio.create_task(self.recorder.run())
         
-        print("All tasks created, waiting for them to start...")
+        log.debug("All tasks created, waiting for them to start...")
         await asyncio.sleep(0.1)  # Let tasks start
+
+        # Drop the garbage left by config parsing before serving commands
+        memory.collect()
         
-        print("Entering main loop")
+        log.info("Entering main loop")
 
         while True:
             await asyncio.sleep(3600)
@@ -0,0 +1,210 @@
+import json
+import uasyncio as asyncio
+try:
+    from typing import List, Optional
+except ImportError:
+    pass
+from patch import Bank, Patch
+import logger as log
+
+
+class PatchView:
+    """Everything the UI needs about one patch, computed once."""
+    __slots__ = ("active_loops", "active_switches", "sse", "html_context")
+
+    def __init__(self, active_loops: List[int], active_switches: List[int], sse: bytes, html_context: dict):
+        self.active_loops = active_loops
+        self.active_switches = active_switches
+        self.sse = sse
+        self.html_context = html_context
+
+
+class BankView:
+    """Prepared view of one bank: patch states, SSE payloads and HTML context."""
+    __slots__ = ("index", "name", "patch_names", "patches", "sse_idle")
+
+    def __init__(self, bank: Bank, index: int, footSwitch):
+        self.index = index
+        self.name = bank.name
+        self.patch_names = [patch.name for patch in bank.patches]
+        switches = footSwitch.get_footswitch()
+        self.patches = [
+            self._build_patch(patch, position, switches)
+            for position, patch in enumerate(bank.patches)
+        ]
+        # Sent while none of this bank's patches has been selected yet
+        self.sse_idle = self._sse({
+            "bank": self.name,
+            "bank_index": index,
+            "patch_index": -1,
+            "midi_presets": [],
+            "active_loops": [],
+            "active_switches": [],
+            "patch_names": self.patch_names
+        })
+
+    @staticmethod
+    def _sse(payload: dict) -> bytes:
+        return f"data: {json.dumps(payload)}\n\n".encode()
+
+    def _build_patch(self, patch: Patch, position: int, switches) -> PatchView:
+        # Patch.select() drives footswitch i from bit i of switch_mask
+        active_loops = [i + 1 for i in range(len(patch.pedalList)) if patch.is_loop_active(i)]
+        active_switches = [i + 1 for i in range(len(switches)) if patch.is_switch_active(i)]
+
+        payload = {
+            "bank": self.name,
+            "bank_index": self.index,
+            "patch_index": position,
+            "midi_presets": patch.get_midi_list(),
+            "active_loops": active_loops,
+            "active_switches": active_switches,
+            "patch_names": self.patch_names
+        }
+        sse = self._sse(payload)
+
+        context = {
+            "bank": self.name,
+            "patch": patch.name,
+            "midi_data": patch.get_midi_list_html()
+        }
+        for i, pedal in enumerate(patch.pedalList):
+            context[f"loop{i + 1}_name"] = pedal.name
+            context[f"loop{i + 1}_status"] = "enabled" if patch.is_loop_active(i) else "disabled"
+        for i, sw in enumerate(switches):
+            context[f"switch{i + 1}_name"] = sw.name
+            context[f"switch{i + 1}_status"] = "enabled" if patch.is_switch_active(i) else "disabled"
+
+        return PatchView(active_loops, active_switches, sse, context)
+
+    def get_patch(self, patch_index: int) -> Optional[PatchView]:
+        if 0 <= patch_index < len(self.patches):
+            return self.patches[patch_index]
+        return None
+
+    def sse(self, patch_index: int) -> bytes:
+        """SSE message for a patch of this bank, the idle one for -1."""
+        if 0 <= patch_index < len(self.patches):
+            return self.patches[patch_index].sse
+        return self.sse_idle
+
+
+class BankCache:
+    """BankViews keyed by bank index, so every (bank, patch) is a lookup.
+
+    With neighbours < 0 (the default) preload() builds the views of every
+    bank at boot and they are only rebuilt by invalidate() after an edit.
+    Setups with more banks than memory allows set neighbours >= 0 instead:
+    the cache then holds the active bank and its neighbours as an LRU, and
+    after every bank move prefetch() prepares the banks around the new one
+    in a background task, so scrolling finds them ready.
+    """
+
+    def __init__(self, bankManager, neighbours: int = -1):
+        self.bankManager = bankManager
+        self.neighbours = neighbours
+        self.full = neighbours < 0
+        if self.full:
+            self.capacity = max(len(bankManager.banks), 1)
+        else:
+            # Active bank, its neighbours on both sides and one spare slot
+            self.capacity = 2 * neighbours + 2
+        self.views = {}
+        self.order = []  # bank indices, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._prefetch_task = None
+        self.empty = None
+
+    def _build(self, index: int) -> BankView:
+        bm = self.bankManager
+        view = BankView(bm.banks[index], index, bm.footSwitch)
+        self.views[index] = view
+        self.order.append(index)
+        while len(self.order) > self.capacity:
+            del self.views[self.order.pop(0)]
+        return view
+
+    def _touch(self, index: int):
+        if self.order[-1] != index:
+            self.order.remove(index)
+            self.order.append(index)
+
+    def idle(self) -> BankView:
+        """View shown while no bank is active: no patches, the idle SSE."""
+        if self.empty is None:
+            self.empty = BankView(Bank("", []), -1, self.bankManager.footSwitch)
+        return self.empty
+
+    def get(self, index: int) -> BankView:
+        if not 0 <= index < len(self.bankManager.banks):
+            # A stale active_bank_index (banks removed from the catalog)
+            return self.idle()
+        view = self.views.get(index)
+        if view is not None:
+            self.hits += 1
+            self._touch(index)
+            return view
+        self.misses += 1
+        return self._build(index)
+
+    def preload(self):
+        """Build the views of every bank, a no-op for the LRU cache."""
+        if not self.full:
+            return
+        self.capacity = max(len(self.bankManager.banks), 1)
+        for index in range(len(self.bankManager.banks)):
+            if index not in self.views:
+                self._build(index)
+        log.info("Bank snapshots built for", len(self.views), "banks")
+
+    def invalidate(self, index: Optional[int] = None):
+        """Drop cached views after an edit, all of them when index is None.
+
+        The full table is rebuilt right away so lookups never miss. Like
+        CatalogSync.catalog_changed(), which an editor calls with it, this
+        is a hook: banks are only loaded at boot for now.
+        """
+        if index is None:
+            self.views = {}
+            self.order = []
+        elif index in self.views:
+            del self.views[index]
+            self.order.remove(index)
+        self.preload()
+
+    def prefetch(self, center: Optional[int] = None):
+        """Prepare the neighbours of center (the active bank) in the background."""
+        if self.full:
+            return
+        if center is None:
+            center = self.bankManager.get_active_bank_index()
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+        self._prefetch_task = asyncio.create_task(self._prefetch(center))
+
+    async def _prefetch(self, center: int):
+        count = len(self.bankManager.banks)
+        if count == 0:
+            return
+        # Nearest banks first, the active one is on its way to be needed now
+        for distance in range(self.neighbours + 1):
+            for index in ((center + distance) % count, (center - distance) % count):
+                if index not in self.views:
+                    self._build(index)
+                    self.prefetched += 1
+                    await asyncio.sleep_ms(0)
+        # Keep the active bank most recently used so it is evicted last
+        if center % count in self.views:
+            self._touch(center % count)
+        log.debug("Bank cache prefetched around", center)
+
+    def render(self) -> str:
+        """Cache report appended to the /metrics output."""
+        return (
+            f"bank_cache_hits_total {self.hits}\n"
+            f"bank_cache_misses_total {self.misses}\n"
+            f"bank_cache_prefetched_total {self.prefetched}\n"
+            f"bank_cache_size {len(self.views)}\n"
+        )
@@ -1,34 +1,49 @@
-from typing import List, Optional
+try:
+    from typing import List, Optional
+except ImportError:
+    pass
 from file import Json
+from journal import StateStore
 from footswitch import FootSwitch, EffectSwitch
+from clock import MidiClock
 from loop import Pedal
 from midi import Midi, Midi_preset
-from patch import Bank, Patch
+from patch import Bank, Patch, Sequence
+import logger as log
 
 class BankManager:
-    banks: List[Bank] = []
-    statusFile: Json
-    pedalList: List[Pedal] = []
+    banks: List[Bank]
+    statusFile: StateStore
+    pedalList: List[Pedal]
 
     active_bank_name: str = ""
     active_patch_name: str = ""
 
     def __init__(self):
         self.banks = []
+        self.pedalList = []
+        # Last patch sent to the hardware, it keeps sounding across bank moves
+        self.applied_patch: Optional[Patch] = None
         self.file = Json()
-        self.statusFile: Json = Json('active_status.json')
+        self.statusFile: StateStore = StateStore('state', legacy_file='active_status.json')
 
         active_bank_index = self.get_active_bank_index()
         active_patch_index = self.get_active_patch_index()
 
         self.footSwitch = FootSwitch()
         self.midi = Midi()
+        self.clock = MidiClock(self.midi, self.file.data.get("clock"))
 
         for pedalData in self.file.data.get("pedalList", []):
             self.pedalList.append(Pedal(id=pedalData.get("id", 0), name=pedalData.get("name", "")))
+        # Validates the pin map, a bad one stops here before any pin is driven
+        self.router = None
+        if self.file.data.get("routing"):
+            from routing import create_router
+            self.router = create_router(self.file.data, self.pedalList)
 
         for bank_index, bank_data in enumerate(self.file.data.get("banks", [])):
-            print(f"Index: {bank_index}, Bank Data: {bank_data}")
+            log.debug('Index:', bank_index, 'Bank Data:', bank_data)
 
             patches = []
             for patch_index, patch_data in enumerate(bank_data.get("patches", [])):
@@ -37,18 +52,23 @@ class BankManager:
                     patch_data = patch_data,
                     footSwitch = self.footSwitch, 
                     active = (bank_index == active_bank_index and patch_index == active_patch_index),
-                    pedalList = self.pedalList
+                    pedalList = self.pedalList,
+                    midi = self.midi,
+                    router = self.router
                 )
 
                 if patch.active:
                     patch.select()
+                    self.applied_patch = patch
+                    self.apply_tempo(patch)
                     self.set_active_patch_name(patch)
                 patches.append(patch)
                 
             bank = Bank(
                 name = bank_data.get("name", ""),
                 patches = patches,
-                active = (bank_index == active_bank_index)
+                active = (bank_index == active_bank_index),
+                sequences = [Sequence(sequence_data) for sequence_data in bank_data.get("sequences", [])]
             )
             if bank.active:
                 self.set_active_bank_name(bank.name)
@@ -61,7 +81,11 @@ class BankManager:
         return self.statusFile.data.get("active_patch_index", 0)
 
     def get_active_bank(self) -> Optional[Bank]:
-        return next((bank for bank in self.banks if bank.active), None)
+        # Indexed rather than searched, the broadcast loop calls this every tick
+        index = self.get_active_bank_index()
+        if 0 <= index < len(self.banks) and self.banks[index].active:
+            return self.banks[index]
+        return None
     
     def get_banks_count(self) -> int:
         return len(self.banks)
@@ -90,7 +114,7 @@ class BankManager:
         self.set_active_bank(self.banks[new_bank_index], new_bank_index)
         return self.banks[new_bank_index]
 
-    def select_patch(self, patch_index: int) -> Optional[Patch]:
+    def select_patch(self, patch_index: int, persist: bool = True) -> Optional[Patch]:
         current_bank = self.get_active_bank()
         if current_bank:
             current_patch = current_bank.get_active_patch()
@@ -98,13 +122,21 @@ class BankManager:
     
             if new_patch:
                 new_patch.select()
+                self.applied_patch = new_patch
+                self.apply_tempo(new_patch)
                 if current_patch:
                     current_patch.deactivate()
             
-                self.set_active_patch(new_patch, patch_index)
+                self.set_active_patch(new_patch, patch_index, persist)
+                current_bank.set_active_index(patch_index)
                 return new_patch
 
 
+    def apply_tempo(self, patch: Patch):
+        """Patches with a "bpm" set the clock tempo, others keep the current one."""
+        if patch.bpm:
+            self.clock.set_bpm(patch.bpm)
+
     def set_active_bank(self, bank: Bank, new_bank_index: int):
         bank.activate(self.statusFile, new_bank_index)
         self.set_active_bank_name(bank.name)
@@ -115,9 +147,13 @@ class BankManager:
     def get_active_bank_name(self) -> str:
         return self.active_bank_name or ""
     
-    def set_active_patch(self, patch: Patch, new_patch_index: int):
-        patch.activate(self.statusFile, new_patch_index)
+    def set_active_patch(self, patch: Patch, new_patch_index: int, persist: bool = True):
+        patch.activate(self.statusFile, new_patch_index, persist)
         self.set_active_patch_name(patch)
+
+    def save_status(self):
+        """Write selections made with persist=False to flash."""
+        self.statusFile.save()
     
     def set_active_patch_name(self, active_patch: Patch):
         self.active_patch_name = active_patch.name
@@ -138,28 +174,4 @@ class BankManager:
             return [patch.name for patch in current_bank.patches]
         return []
     
-    
-    def get_html_context(self, active_patch: Patch | None):
-
-        if active_patch is None:
-            return {}
-        
-        context = {
-            "bank": self.get_active_bank_name(),
-            "patch": self.get_active_patch_name(),
-            "midi_data": active_patch.get_midi_list_html()
-        }
-
-        for i, loop in enumerate(active_patch.get_loops(), start=1):
-            context[f"loop{i}_name"] = loop.pedal.name
-            context[f"loop{i}_status"] = loop.get_css_class()
-
-        for i, sw in enumerate(self.footSwitch.get_footswitch(), start=1):
-            context[f"switch{i}_name"] = sw.name
-            context[f"switch{i}_status"] = sw.get_css_class()
-        
-
-        print('Getting HTML context for patch:', context)
-        return context
-    
     
\ No newline at end of file
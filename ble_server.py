@@ -2,6 +2,7 @@ import bluetooth
 from micropython import const
 import struct
 import time
+import logger as log
 
 # BLE UUIDs
 _SERVICE_UUID = bluetooth.UUID(0x1815)  # Custom service
@@ -26,13 +27,15 @@ class BLEServer:
         self.register_services()
         self.advertise()
         self.connected = False
-        print(f"BLE Server '{name}' started")
+        self.conn_handle = None
+        log.info('BLE Server', name, 'started')
 
     def register_services(self):
         # Define the command characteristic (writable)
+        # Notify carries replies such as catalog sync chunks
         command_char = (
             _COMMAND_CHAR_UUID,
-            _FLAG_WRITE | _FLAG_READ,
+            _FLAG_WRITE | _FLAG_READ | _FLAG_NOTIFY,
         )
         
         service = (
@@ -41,22 +44,22 @@ class BLEServer:
         )
         
         ((self.command_handle,),) = self.ble.gatts_register_services((service,))
-        print("BLE services registered")
+        log.info("BLE services registered")
 
     def advertise(self, interval_us=500000):
         # Advertise the service
-        print(f"Starting BLE advertising...")
-        print(f"  Device name: {self.name}")
-        print(f"  Interval: {interval_us}us")
+        log.info("Starting BLE advertising...")
+        log.debug("  Device name:", self.name)
+        log.debug("  Interval:", interval_us, "us")
         
         payload = self._payload(self.name)
-        print(f"  Advertising payload ({len(payload)} bytes): {payload.hex()}")
+        log.debug("  Advertising payload:", payload)
         
         self.ble.gap_advertise(
             interval_us,
             payload
         )
-        print(f"BLE advertising as '{self.name}' - should be visible now!")
+        log.info("BLE advertising as", self.name)
 
     def _payload(self, name):
         # Generate advertising payload
@@ -77,12 +80,14 @@ class BLEServer:
         if event == _IRQ_CENTRAL_CONNECT:
             conn_handle, _, _ = data
             self.connected = True
-            print(f"BLE client connected (handle: {conn_handle})")
+            self.conn_handle = conn_handle
+            log.info("BLE client connected, handle:", conn_handle)
             
         elif event == _IRQ_CENTRAL_DISCONNECT:
             conn_handle, _, _ = data
             self.connected = False
-            print(f"BLE client disconnected (handle: {conn_handle})")
+            self.conn_handle = None
+            log.info("BLE client disconnected, handle:", conn_handle)
             # Restart advertising
             self.advertise()
             
@@ -91,11 +96,16 @@ class BLEServer:
             if value_handle == self.command_handle:
                 # Read the written value
                 command_data = self.ble.gatts_read(self.command_handle)
-                print(f"BLE received {len(command_data)} bytes: {command_data.hex()}")
+                log.debug("BLE received", command_data)
                 
                 # Call the callback with the command data
                 if self.command_callback:
-                    self.command_callback(command_data)
+                    self.command_callback(command_data, self.notify, "ble")
+
+    def notify(self, data: bytes):
+        """Send data to the connected central through the command characteristic."""
+        if self.conn_handle is not None:
+            self.ble.gatts_notify(self.conn_handle, self.command_handle, data)
 
     def is_connected(self):
         return self.connected
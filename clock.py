@@ -0,0 +1,126 @@
+import time
+from array import array
+from machine import Timer
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from midi import Midi, CLOCK
+import logger as log
+import metrics
+
+PPQN = 24
+MIN_BPM = 30
+MAX_BPM = 300
+
+# Taps further apart than this start a new tempo
+_TAP_RESET_MS = 2000
+# Taps closer than MAX_BPM allows are bounces or duplicated commands
+_TAP_MIN_MS = 60000 // MAX_BPM
+_TAP_HISTORY = 4
+
+
+class MidiClock:
+    """24 ppqn MIDI clock with tap tempo.
+
+    Pulses are due at absolute ticks_us deadlines; each deadline is the
+    previous one plus the pulse interval, so late pulses do not accumulate
+    drift. A 1 ms hardware timer checks the deadline from a soft interrupt,
+    which keeps the clock running while the event loop is busy rendering
+    pages or serving SSE. The lateness of every pulse is recorded in the
+    midi_clock_jitter_us histogram.
+    """
+
+    def __init__(self, midi: Midi, cfg: Optional[dict] = None):
+        cfg = cfg or {}
+        self.midi = midi
+        self.bpm = self._clamp(cfg.get("bpm", 120))
+        self.interval_us = self._interval(self.bpm)
+        self.running = False
+        self.next_us = 0
+        self.timer = None
+
+        self._taps = array("L", [0] * _TAP_HISTORY)
+        self._tap_count = 0
+        self._last_tap = 0
+
+        if cfg.get("autostart", False):
+            self.start()
+
+    @staticmethod
+    def _clamp(bpm) -> int:
+        return min(max(int(bpm), MIN_BPM), MAX_BPM)
+
+    @staticmethod
+    def _interval(bpm) -> int:
+        return 60000000 // (MidiClock._clamp(bpm) * PPQN)
+
+    def set_bpm(self, bpm):
+        bpm = self._clamp(bpm)
+        if bpm == self.bpm:
+            return
+        self.bpm = bpm
+        self.interval_us = self._interval(bpm)
+        log.info("Clock BPM", bpm)
+
+    def tap(self):
+        """Register a tap, the tempo follows the average of the recent taps."""
+        now = time.ticks_ms()
+        gap = time.ticks_diff(now, self._last_tap)
+        if self._tap_count and gap < _TAP_MIN_MS:
+            return
+        self._last_tap = now
+        if self._tap_count and gap > _TAP_RESET_MS:
+            self._tap_count = 0
+        if self._tap_count == 0:
+            self._tap_count = 1
+            return
+
+        self._taps[(self._tap_count - 1) % _TAP_HISTORY] = gap
+        self._tap_count += 1
+        used = min(self._tap_count - 1, _TAP_HISTORY)
+        total = 0
+        for i in range(used):
+            total += self._taps[i]
+        self.set_bpm(60000 * used // total)
+
+    # ---------- Transport ----------
+
+    def start(self):
+        if self.running:
+            return
+        self.midi.send_start()
+        self.next_us = time.ticks_add(time.ticks_us(), self.interval_us)
+        self.running = True
+        self.timer = Timer(period=1, mode=Timer.PERIODIC, callback=self._poll)
+        log.info("Clock started at", self.bpm, "BPM")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.timer:
+            self.timer.deinit()
+            self.timer = None
+        self.midi.send_stop()
+        log.info("Clock stopped")
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def _poll(self, timer):
+        if not self.running:
+            return
+        now = time.ticks_us()
+        late = time.ticks_diff(now, self.next_us)
+        if late < 0:
+            return
+        self.midi.send_realtime(CLOCK)
+        metrics.observe(metrics.CLOCK_JITTER, late)
+        self.next_us = time.ticks_add(self.next_us, self.interval_us)
+        # After a long stall skip the missed pulses instead of bursting them
+        if time.ticks_diff(now, self.next_us) > 0:
+            self.next_us = time.ticks_add(now, self.interval_us)
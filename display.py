@@ -0,0 +1,130 @@
+import uasyncio as asyncio
+from machine import SoftI2C, Pin
+from lib_lcd1602_2004_with_i2c import LCD
+import logger as log
+
+# Row start addresses of HD44780 displays (1602 and 2004)
+_ROW_ADDR = (0x80, 0xC0, 0x80 + 20, 0xC0 + 20)
+
+# Longest run of characters written before yielding to the event loop
+_MAX_RUN = 8
+
+
+class Display:
+    """LCD status display showing the active bank, patch and loops.
+
+    Commands only mark the display dirty; the run() task composes the frame
+    and writes only the characters that differ from what the LCD already
+    shows, yielding between short I2C transfers so a write never holds up a
+    patch switch.
+    """
+
+    def __init__(self, cfg: dict, bankManager):
+        self.bankManager = bankManager
+        self.cols = cfg.get("cols", 16)
+        self.rows = cfg.get("rows", 2)
+        self.dirty = asyncio.Event()
+        self.enabled = False
+
+        i2c = SoftI2C(scl=Pin(cfg.get("scl", 1)), sda=Pin(cfg.get("sda", 0)), freq=cfg.get("freq", 400000))
+        self.lcd = LCD(i2c)
+        if not self.lcd.found:
+            log.warning("LCD not found, display disabled")
+            return
+
+        size = self.cols * self.rows
+        # shadow is what the LCD shows, frame is what it should show
+        self.shadow = bytearray(b" " * size)
+        self.frame = bytearray(b" " * size)
+        self.enabled = True
+        log.info("LCD ready", self.cols, "x", self.rows)
+        self.refresh()
+
+    def refresh(self):
+        """Mark the display dirty, cheap enough for the command path."""
+        if self.enabled:
+            self.dirty.set()
+
+    # ---------- Frame ----------
+
+    def _put(self, row: int, col: int, text: str, width: int):
+        base = row * self.cols + col
+        frame = self.frame
+        n = 0
+        for ch in text:
+            if n >= width:
+                break
+            code = ord(ch)
+            frame[base + n] = code if 32 <= code < 127 else 0x3F  # '?'
+            n += 1
+        while n < width:
+            frame[base + n] = 0x20
+            n += 1
+
+    def _loop_map(self, patch) -> str:
+        # One character per loop: its number when active, '-' when bypassed
+        if patch is None:
+            return ""
+        return "".join(
+            str(i + 1) if patch.is_loop_active(i) else "-"
+            for i in range(len(patch.pedalList))
+        )
+
+    def compose(self):
+        bm = self.bankManager
+        # Number, name and loops all come from the bank being shown
+        bank = bm.get_active_bank()
+        patch = bank.get_active_patch() if bank else None
+        loops = self._loop_map(patch)
+        cols = self.cols
+
+        self._put(0, 0, f"{bm.get_active_bank_index() + 1}:{bm.get_active_bank_name()}", cols)
+        patch_text = f"{bank.active_index + 1}:{patch.name}" if patch else ""
+
+        if self.rows >= 3:
+            self._put(1, 0, patch_text, cols)
+            self._put(2, 0, "Loops " + loops, cols)
+            for row in range(3, self.rows):
+                self._put(row, 0, "", cols)
+        else:
+            # Patch name and loop map share the second row
+            map_width = min(len(loops), cols // 2)
+            name_width = cols - map_width - (1 if map_width else 0)
+            self._put(1, 0, patch_text, name_width)
+            self._put(1, cols - map_width, loops, map_width)
+            if map_width:
+                self.frame[cols + name_width] = 0x20
+
+    # ---------- Writer ----------
+
+    async def flush(self):
+        """Write the characters that changed, in short runs."""
+        lcd = self.lcd
+        frame = self.frame
+        shadow = self.shadow
+        cols = self.cols
+        for row in range(self.rows):
+            base = row * cols
+            col = 0
+            while col < cols:
+                if frame[base + col] == shadow[base + col]:
+                    col += 1
+                    continue
+                start = col
+                lcd.add_command(_ROW_ADDR[row] + start)
+                while col < cols and col - start < _MAX_RUN and frame[base + col] != shadow[base + col]:
+                    lcd.add_data(frame[base + col])
+                    shadow[base + col] = frame[base + col]
+                    col += 1
+                lcd.execute(0)
+                await asyncio.sleep_ms(0)
+
+    async def run(self):
+        if not self.enabled:
+            return
+        log.info("Display task started")
+        while True:
+            await self.dirty.wait()
+            self.dirty.clear()
+            self.compose()
+            await self.flush()
@@ -0,0 +1,172 @@
+import math
+import time
+import uasyncio as asyncio
+from machine import ADC, Pin
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from midi import Midi
+import logger as log
+import metrics
+
+# Expression pedals: ADC inputs sampled at a fixed rate and sent as MIDI CC.
+#
+#   "expression": {
+#       "rate_hz": 100,
+#       "inputs": [{"name": "exp1", "pin": 26, "channel": 1, "cc": 11, "curve": "linear"}]
+#   }
+#
+# Each raw 16-bit reading goes through an exponential moving average, then a
+# dead-band: the 7-bit position only moves once the smoothed value is more
+# than "deadband" raw units away from the one that produced the last
+# position. A patch may remap an input with its own "expression" entry
+# (same keys as an input, or null to mute it); mappings are compiled into
+# 128-byte lookup tables at load time, so a sample costs a table lookup.
+
+DEFAULT_RATE_HZ = 100
+MAX_RATE_HZ = 1000        # one tick per event loop millisecond
+DEFAULT_SMOOTHING = 3     # EMA weight 1/2**smoothing
+DEFAULT_DEADBAND = 384    # raw 16-bit units, 3/4 of a 7-bit step
+
+# Tables shared by every mapping with the same curve and range
+_tables = {}
+
+
+def _shape(curve, x: float) -> float:
+    if curve == "log":
+        return math.log(1 + 9 * x) / math.log(10)
+    if curve == "exp":
+        return (math.pow(10, x) - 1) / 9
+    if isinstance(curve, list):
+        # [[in, out], ...] breakpoints, both in 0-127
+        points = sorted(curve)
+        position = x * 127
+        if position <= points[0][0]:
+            return points[0][1] / 127
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if position <= x1:
+                return (y0 + (y1 - y0) * (position - x0) / max(x1 - x0, 1)) / 127
+        return points[-1][1] / 127
+    return x
+
+
+def build_table(curve="linear", low: int = 0, high: int = 127) -> bytes:
+    """Pedal position (0-127) to CC value lookup table."""
+    key = (str(curve), low, high)
+    table = _tables.get(key)
+    if table is None:
+        table = bytes(
+            min(max(round(low + (high - low) * _shape(curve, i / 127)), 0), 127)
+            for i in range(128)
+        )
+        _tables[key] = table
+    return table
+
+
+class Mapping:
+    __slots__ = ("channel", "cc", "table")
+
+    def __init__(self, data: dict):
+        self.channel = data.get("channel", 1)
+        self.cc = data.get("cc", 11)
+        self.table = build_table(data.get("curve", "linear"), data.get("min", 0), data.get("max", 127))
+
+
+def compile_mappings(data) -> Optional[dict]:
+    """Per-patch {"input name": Mapping or None}, None when the patch has none."""
+    if not data:
+        return None
+    return {name: Mapping(entry) if entry else None for name, entry in data.items()}
+
+
+class ExpressionInput:
+    __slots__ = ("name", "adc", "mapping", "smoothing", "deadband", "level", "anchor", "position", "value")
+
+    def __init__(self, cfg: dict):
+        self.name = cfg.get("name", "exp")
+        self.adc = ADC(Pin(cfg.get("pin", 26)))
+        self.mapping = Mapping(cfg) if "cc" in cfg else None
+        self.smoothing = cfg.get("smoothing", DEFAULT_SMOOTHING)
+        self.deadband = cfg.get("deadband", DEFAULT_DEADBAND)
+        self.level = self.adc.read_u16()
+        self.anchor = self.level
+        self.position = self.level >> 9
+        self.value = -1  # last CC value sent, -1 forces the next one out
+
+    def sample(self) -> int:
+        """Read the ADC, returns the pedal position (0-127)."""
+        self.level += (self.adc.read_u16() - self.level) >> self.smoothing
+        if abs(self.level - self.anchor) > self.deadband:
+            self.anchor = self.level
+            self.position = self.level >> 9
+        return self.position
+
+
+class ExpressionPedals:
+    """Samples every input and sends CC changes on the shared Midi UART.
+
+    Patch changes write their Program Changes straight to the UART, so to
+    keep them from queueing behind pedal traffic a CC is only written once
+    the UART has drained. While it is busy the value is held back and the
+    newest one goes out on a later tick.
+    """
+
+    def __init__(self, cfg: dict, midi: Midi, get_patch):
+        self.midi = midi
+        self.get_patch = get_patch
+        rate_hz = min(max(int(cfg.get("rate_hz", DEFAULT_RATE_HZ)), 1), MAX_RATE_HZ)
+        if rate_hz != cfg.get("rate_hz", rate_hz):
+            log.warning("Expression rate_hz", cfg["rate_hz"], "out of range, using", rate_hz)
+        self.period_ms = 1000 // rate_hz
+        self.inputs = [ExpressionInput(input_cfg) for input_cfg in cfg.get("inputs", [])]
+        self.patch = None
+        self.held = 0
+
+    def _mapping(self, pedal: ExpressionInput, patch):
+        mappings = patch.expression if patch is not None else None
+        if mappings is not None and pedal.name in mappings:
+            return mappings[pedal.name]
+        return pedal.mapping
+
+    def tick(self):
+        patch = self.get_patch()
+        if patch is not self.patch:
+            # Resend the pedal position through the new patch's mapping
+            self.patch = patch
+            for pedal in self.inputs:
+                pedal.value = -1
+
+        for pedal in self.inputs:
+            position = pedal.sample()
+            mapping = self._mapping(pedal, patch)
+            if mapping is None:
+                continue
+            value = mapping.table[position]
+            if value == pedal.value:
+                continue
+            if not self.midi.tx_idle():
+                self.held += 1
+                continue
+            self.midi.send_cc_running(mapping.channel, mapping.cc, value)
+            metrics.inc(metrics.EXPRESSION_CC)
+            pedal.value = value
+
+    async def run(self):
+        log.info("Expression pedals:", len(self.inputs), "at", 1000 // self.period_ms, "Hz")
+        deadline = time.ticks_ms()
+        while True:
+            t0 = metrics.start()
+            self.tick()
+            metrics.stop(metrics.EXPRESSION, t0)
+            # Fixed rate: the next tick is due one period after the last one
+            deadline = time.ticks_add(deadline, self.period_ms)
+            delay = time.ticks_diff(deadline, time.ticks_ms())
+            if delay < 0:
+                deadline = time.ticks_ms()
+                delay = 0
+            await asyncio.sleep_ms(delay)
+
+    def render(self) -> str:
+        """Report appended to the /metrics output."""
+        return f"expression_held_total {self.held}\n"
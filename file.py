@@ -1,26 +1,38 @@
 import json
+import logger as log
+import metrics
 
 class Json:
 
     def __init__(self, fileName: str = "config.json"):
         self.fileName = fileName
-        print(f'Init Json File {self.fileName}')
+        log.debug('Init Json File', self.fileName)
 
         with open(self.fileName, 'r') as file:
             self.file = file
             self.data = json.load(file)
 
 
+    def set(self, key: str, value):
+        # Update the in-memory data only, save() writes it out later
+        self.data[key] = value
+
+    def save(self):
+        t0 = metrics.start()
+        with open(self.fileName, 'w') as file:
+            json.dump(self.data, file)
+        metrics.stop(metrics.FLASH_WRITE, t0)
+        metrics.inc(metrics.FLASH_WRITES)
+
     def save_to_file(self, key: str, value):
         # Update the in-memory data
-        self.data[key] = value
+        self.set(key, value)
 
-        print(f'Updated data: {self.data} for key: {key} with value: {value} in {self.fileName}')
+        log.debug('Updated data:', self.data, 'for key:', key, 'with value:', value, 'in', self.fileName)
 
         # Save the updated data back to the file
-        with open(self.fileName, 'w') as file:
-            json.dump(self.data, file)
-            print(f'Saved {key}: {value} to {self.fileName}')
+        self.save()
+        log.info('Saved', key, '=', value, 'to', self.fileName)
 
 class Html:
 
@@ -1,36 +1,48 @@
 from machine import Pin
-from typing import List, Optional
+try:
+    from typing import List, Optional
+except ImportError:
+    pass
 from file import Json
+import logger as log
 
 # One EffectSwitch represents a single button from the footswitch
 class EffectSwitch:
     ACTIVE_PIN_VALUE: int = 1
     INACTIVE_PIN_VALUE: int = 0
 
+    __slots__ = ("name", "pin", "active", "order")
+
     name: str
     pin: Pin
-    active: bool = False
+    active: bool
     order: int
     
     def __init__(self, name: str, pin: int):
         
         self.name = name
-        self.pin = Pin(pin, Pin.OUT)
+        # Start from a known pin state so unchanged switches can skip the write
+        self.pin = Pin(pin, Pin.OUT, value=self.INACTIVE_PIN_VALUE)
+        self.active = False
         self.order = pin
         
-        print('Init Effect Switch', name)
+        log.debug('Init Effect Switch', name)
 
     def activate(self):
+        if self.active:
+            return
         self.active = True
         self.pin.value(self.ACTIVE_PIN_VALUE) 
     
-        print(f'Loop {self.name} activated')
+        log.debug('Loop', self.name, 'activated')
 
     def deactivate(self):
+        if not self.active:
+            return
         self.active = False
         self.pin.value(self.INACTIVE_PIN_VALUE) 
         
-        print(f'Loop {self.name} deactivated')
+        log.debug('Loop', self.name, 'deactivated')
 
     def get_css_class(self) -> str:
         return "enabled" if self.active else "disabled"
@@ -51,7 +63,7 @@ class FootSwitch:
     def add_effectSwitch(self, name: str,  pin: int):
         switch = EffectSwitch(name=name, pin=pin)
         self.__footSwitch.append(switch)
-        print(f'Added switch {name} with pin {pin}')
+        log.debug('Added switch', name, 'with pin', pin)
 
     def get_footswitch(self) -> List[EffectSwitch]:
         return sorted(self.__footSwitch, key=lambda x: x.order)
\ No newline at end of file
@@ -0,0 +1,228 @@
+import logger as log
+
+# Incremental HTTP/1.1 request parser working on a caller supplied bytearray.
+#
+# The request head is read into the buffer until the blank line, then only
+# the request line and the few headers the server cares about are decoded.
+# Body bytes that arrived with the head are moved to the start of the buffer
+# and the rest of the body is read in place, so a request costs a handful of
+# small allocations instead of one decoded string and dict entry per header.
+
+MAX_HEADERS = 24
+
+STATUS_TEXT = {
+    100: "Continue",
+    200: "OK",
+    204: "No Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    501: "Not Implemented",
+    503: "Service Unavailable",
+}
+
+_CRLF = b"\r\n"
+_HEAD_END = b"\r\n\r\n"
+
+
+class HttpError(Exception):
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "content_length", "chunked", "expect_continue", "head", "body")
+
+    def __init__(self, method: str, path: str, query: str):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.content_length = -1  # -1: no Content-Length header
+        self.chunked = False
+        self.expect_continue = False
+        self.head = False  # HEAD request answered by the GET handler
+        self.body = memoryview(b"")
+
+
+async def read_request(reader, buf: bytearray):
+    """Read a request head into buf, returns a Request or None on EOF.
+
+    Raises HttpError(431) when the head does not fit in buf or has more than
+    MAX_HEADERS lines, HttpError(400) when it is malformed. Any body bytes
+    received with the head are left at the start of buf and recorded in
+    request.body; call read_body() to get the rest.
+    """
+    view = memoryview(buf)
+    filled = 0
+    end = -1
+    while end < 0:
+        if filled >= len(buf):
+            raise HttpError(431)
+        n = await reader.readinto(view[filled:])
+        if not n:
+            if filled == 0:
+                return None
+            raise HttpError(400)
+        # Only search the new bytes plus the 3 before them for the blank line
+        start = filled - 3 if filled > 3 else 0
+        filled += n
+        idx = bytes(view[start:filled]).find(_HEAD_END)
+        if idx >= 0:
+            end = start + idx
+
+    head = bytes(view[:end])
+    line_end = head.find(_CRLF)
+    if line_end < 0:
+        line_end = len(head)
+
+    parts = head[:line_end].split()
+    if len(parts) != 3 or not parts[2].startswith(b"HTTP/"):
+        raise HttpError(400)
+
+    target = parts[1].decode()
+    q = target.find("?")
+    if q >= 0:
+        request = Request(parts[0].decode(), target[:q], target[q + 1:])
+    else:
+        request = Request(parts[0].decode(), target, "")
+
+    _parse_headers(request, head, line_end + 2)
+
+    # Move the body bytes that came with the head to the front of the buffer
+    leftover = filled - (end + 4)
+    if leftover > 0:
+        view[:leftover] = view[end + 4:filled]
+    request.body = view[:leftover]
+    return request
+
+
+def _parse_headers(request: Request, head: bytes, pos: int):
+    # Header names are case-insensitive, values of the ones we keep are too
+    headers = head[pos:].lower()
+    pos = 0
+    count = 0
+    length = len(headers)
+    while pos < length:
+        nl = headers.find(_CRLF, pos)
+        if nl < 0:
+            nl = length
+        count += 1
+        if count > MAX_HEADERS:
+            raise HttpError(431)
+        colon = headers.find(b":", pos, nl)
+        if colon < 0:
+            raise HttpError(400)
+
+        if headers.startswith(b"content-length", pos) and colon == pos + 14:
+            try:
+                request.content_length = int(headers[colon + 1:nl].strip())
+            except ValueError:
+                raise HttpError(400)
+            if request.content_length < 0:
+                raise HttpError(400)
+        elif headers.startswith(b"transfer-encoding", pos) and colon == pos + 17:
+            if b"chunked" in headers[colon + 1:nl]:
+                request.chunked = True
+            else:
+                raise HttpError(501)
+        elif headers.startswith(b"expect", pos) and colon == pos + 6:
+            request.expect_continue = b"100-continue" in headers[colon + 1:nl]
+
+        pos = nl + 2
+
+
+async def read_body(reader, writer, request: Request, buf: bytearray) -> memoryview:
+    """Read the rest of the body into buf and return a view of it.
+
+    Raises HttpError(413) when the body does not fit in buf.
+    """
+    view = memoryview(buf)
+    received = len(request.body)
+
+    if request.chunked:
+        if request.expect_continue and received == 0:
+            await writer.awrite("HTTP/1.1 100 Continue\r\n\r\n")
+        while not _chunks_complete(view, received):
+            if received >= len(buf):
+                raise HttpError(413)
+            n = await reader.readinto(view[received:])
+            if not n:
+                raise HttpError(400)
+            received += n
+        request.body = view[:_dechunk(view, received)]
+        return request.body
+
+    length = max(request.content_length, 0)
+    if length > len(buf):
+        raise HttpError(413)
+    if request.expect_continue and received < length:
+        await writer.awrite("HTTP/1.1 100 Continue\r\n\r\n")
+    while received < length:
+        n = await reader.readinto(view[received:length])
+        if not n:
+            raise HttpError(400)
+        received += n
+    request.body = view[:length]
+    return request.body
+
+
+def _chunks_complete(view: memoryview, received: int) -> bool:
+    """Walk the chunk headers to see whether the final chunk has arrived."""
+    data = bytes(view[:received])
+    pos = 0
+    while True:
+        nl = data.find(_CRLF, pos)
+        if nl < 0:
+            return False
+        size = _chunk_size(data[pos:nl])
+        if size == 0:
+            return data.find(_CRLF, nl + 2) >= 0
+        pos = nl + 2 + size + 2
+        if pos > received:
+            return False
+
+
+def _dechunk(view: memoryview, received: int) -> int:
+    """Compact the chunk payloads to the front of view, returns their length."""
+    data = bytes(view[:received])
+    pos = 0
+    out = 0
+    while True:
+        nl = data.find(_CRLF, pos)
+        size = _chunk_size(data[pos:nl])
+        if size == 0:
+            return out
+        view[out:out + size] = data[nl + 2:nl + 2 + size]
+        out += size
+        pos = nl + 2 + size + 2
+
+
+def _chunk_size(line: bytes) -> int:
+    # Chunk extensions after ';' are allowed and ignored
+    semi = line.find(b";")
+    if semi >= 0:
+        line = line[:semi]
+    try:
+        return int(line.strip(), 16)
+    except ValueError:
+        raise HttpError(400)
+
+
+async def send_response(writer, status: int, body=b"", content_type: str = "text/plain", head: bool = False, headers: str = ""):
+    """Write a complete response; body is skipped for HEAD requests."""
+    if isinstance(body, str):
+        body = body.encode()
+    await writer.awrite(
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n{headers}\r\n"
+    )
+    if body and not head:
+        await writer.awrite(body)
+    log.debug("HTTP", status)
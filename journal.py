@@ -0,0 +1,168 @@
+import json
+import os
+import struct
+from binascii import crc32
+import logger as log
+import metrics
+
+# Append-only journal for runtime state (active bank/patch and friends).
+#
+# Every record holds the complete state, so recovery only needs the newest
+# record with a valid checksum:
+#
+#     magic (1) | seq (4) | length (2) | JSON payload | crc32 (4)
+#
+# Records are appended to one of FILES journal files. When the current file
+# is full the next one is truncated and starts with a fresh snapshot, which
+# compacts the journal and spreads the writes over all files. A record cut
+# short by a power loss fails its checksum and recovery falls back to the
+# previous one. Recovery reads at most FILES * (MAX_FILE_BYTES +
+# MAX_RECORD_BYTES) bytes.
+
+MAGIC = 0xA5
+_HEADER = "<BIH"
+_HEADER_SIZE = 7
+_CRC_SIZE = 4
+
+FILES = 4
+MAX_FILE_BYTES = 2048
+# Largest state payload _append() writes; a file ends at most one record
+# past max_file_bytes, which bounds what recovery has to read
+MAX_PAYLOAD = 512
+MAX_RECORD_BYTES = _HEADER_SIZE + MAX_PAYLOAD + _CRC_SIZE
+
+
+def _file_name(base: str, index: int) -> str:
+    return f"{base}.{index}.log"
+
+
+def _encode(seq: int, data: dict) -> bytes:
+    payload = json.dumps(data).encode()
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"state record of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    header = struct.pack(_HEADER, MAGIC, seq, len(payload))
+    crc = crc32(payload, crc32(header)) & 0xFFFFFFFF
+    return header + payload + struct.pack("<I", crc)
+
+
+def scan(raw: bytes):
+    """Yield (seq, payload) for every valid record in raw.
+
+    After a damaged record scanning resumes at the next magic byte, so a
+    torn write only costs the record it hit.
+    """
+    pos = 0
+    end = len(raw)
+    while pos + _HEADER_SIZE + _CRC_SIZE <= end:
+        if raw[pos] != MAGIC:
+            pos += 1
+            continue
+        _, seq, length = struct.unpack_from(_HEADER, raw, pos)
+        stop = pos + _HEADER_SIZE + length
+        if length > MAX_PAYLOAD or stop + _CRC_SIZE > end:
+            pos += 1
+            continue
+        crc = crc32(raw[pos + _HEADER_SIZE:stop], crc32(raw[pos:pos + _HEADER_SIZE])) & 0xFFFFFFFF
+        if struct.unpack_from("<I", raw, stop)[0] != crc:
+            pos += 1
+            continue
+        yield seq, raw[pos + _HEADER_SIZE:stop]
+        pos = stop + _CRC_SIZE
+
+
+class StateStore:
+    """Journal backed replacement for the Json status file.
+
+    Offers the same data/set/save/save_to_file interface, so BankManager
+    uses it exactly like it used active_status.json.
+    """
+
+    def __init__(self, base: str = "state", legacy_file: str = "active_status.json", files: int = FILES, max_file_bytes: int = MAX_FILE_BYTES):
+        self.base = base
+        self.files = files
+        self.max_file_bytes = max_file_bytes
+        self.fileName = _file_name(base, 0)
+
+        self.data = {}
+        self.seq = 0
+        self.current = 0
+        self.current_size = 0
+        self.recover()
+
+        if self.seq == 0:
+            self.data = self._load_legacy(legacy_file)
+            self._rotate()
+
+    # ---------- Recovery ----------
+
+    def recover(self):
+        """Load the newest valid record from all journal files."""
+        best_seq = -1
+        best_payload = None
+        for index in range(self.files):
+            try:
+                with open(_file_name(self.base, index), "rb") as f:
+                    raw = f.read(self.max_file_bytes + MAX_RECORD_BYTES)
+            except OSError:
+                continue
+            for seq, payload in scan(raw):
+                if seq > best_seq:
+                    best_seq = seq
+                    best_payload = payload
+                    self.current = index
+                    self.current_size = len(raw)
+
+        if best_payload is None:
+            return
+        try:
+            self.data = json.loads(best_payload)
+            self.seq = best_seq
+            log.info("State recovered, record", best_seq, "from", _file_name(self.base, self.current))
+        except ValueError:
+            log.error("State record", best_seq, "is not valid JSON")
+
+    def _load_legacy(self, fileName: str) -> dict:
+        # First boot after the upgrade, or no valid record at all
+        try:
+            with open(fileName, "r") as f:
+                data = json.load(f)
+            log.info("State migrated from", fileName)
+            return data
+        except (OSError, ValueError):
+            log.warning("No saved state, starting from defaults")
+            return {}
+
+    # ---------- Writing ----------
+
+    def _rotate(self):
+        """Start the next journal file with a full snapshot."""
+        self.current = (self.current + 1) % self.files
+        self.current_size = 0
+        with open(_file_name(self.base, self.current), "wb"):
+            pass
+        self._append()
+
+    def _append(self):
+        self.seq += 1
+        record = _encode(self.seq, self.data)
+        t0 = metrics.start()
+        with open(_file_name(self.base, self.current), "ab") as f:
+            f.write(record)
+        metrics.stop(metrics.FLASH_WRITE, t0)
+        metrics.inc(metrics.FLASH_WRITES)
+        self.current_size += len(record)
+
+    def set(self, key: str, value):
+        # Update the in-memory data only, save() writes it out later
+        self.data[key] = value
+
+    def save(self):
+        if self.current_size >= self.max_file_bytes:
+            self._rotate()
+        else:
+            self._append()
+
+    def save_to_file(self, key: str, value):
+        self.set(key, value)
+        self.save()
+        log.info('Saved', key, '=', value, 'record', self.seq)
@@ -6,6 +6,10 @@
 '''
 import time
 from machine import SoftI2C, Pin
+import logger as log
+
+
+BUF_SIZE = 96  # one 20 character row plus its address command, 4 bytes per character
 
 
 class LCD():
@@ -19,15 +23,20 @@ class LCD():
         # P4-P7: DB4-DB7
 
         self.i2c = i2c
-        print('(Re)Initializing...')
+        self.found = False
+        log.info('LCD (re)initializing...')
         scan_result = i2c.scan()
         while not scan_result:
-            print("Cannot Locate I2C Device")
+            log.warning("Cannot Locate I2C Device")
             return
             time.sleep_ms(10)
             scan_result = i2c.scan()
-        self.LCD_I2C_ADDR = i2c.scan()[0]
-        self.bufs = []  # a list of bytes, created as writing things all in one go with i2c.writeto is more efficient than writing each byte
+        self.LCD_I2C_ADDR = scan_result[0]
+        self.found = True
+        # preallocated transfer buffer, writing things all in one go with i2c.writeto is more efficient than writing each byte
+        self.buf = bytearray(BUF_SIZE)
+        self.buf_view = memoryview(self.buf)
+        self.buf_len = 0
         self.BK = 0x08
         self.RS = 0x00
         self.E = 0x04
@@ -57,20 +66,25 @@ class LCD():
         dat = dat & 0xF0
         dat |= self.BK
         dat |= self.RS
-        
-        self.bufs.append(dat | 0x04) # enable high
-        self.bufs.append(dat) # enable low
-            
-    def execute(self):
+
+        if self.buf_len + 2 > BUF_SIZE:
+            self.execute()
+        self.buf[self.buf_len] = dat | 0x04 # enable high
+        self.buf[self.buf_len + 1] = dat # enable low
+        self.buf_len += 2
+
+    def execute(self, settle_us=50):
+        '''
+        Write the queued bytes in one I2C transfer
+        :param settle_us: wait for the controller afterwards, 0 when the caller yields instead
+        '''
         try:
-            bytearray_to_write = bytearray(len(self.bufs))
-            for i in range(len(self.bufs)):
-                bytearray_to_write[i] = self.bufs[i]
-            self.i2c.writeto(self.LCD_I2C_ADDR, bytearray_to_write)
-            self.bufs=[]
-            time.sleep_us(50)
+            self.i2c.writeto(self.LCD_I2C_ADDR, self.buf_view[:self.buf_len])
+            if settle_us:
+                time.sleep_us(settle_us)
         except Exception as e:
-            print(e)
+            log.error("LCD:", e)
+        self.buf_len = 0
 
     def add_command(self, cmd, run=False):
         self.RS = 0
@@ -136,7 +150,7 @@ class LCD():
                 for i in range(1, len(s)):
                     self.char(ord(s[i]))
         except Exception as e:
-            print(e)
+            log.error("LCD:", e)
         self.execute()
 
     def create_charactor(self, ram_position, char):
@@ -0,0 +1,57 @@
+# Leveled logger used instead of bare print() calls.
+#
+# Printing over USB serial costs milliseconds on the Pico, so logging is OFF by
+# default. Arguments are passed through untouched and only joined by print()
+# when the level is enabled, so a disabled call costs a single comparison.
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR,
+    "off": OFF,
+}
+
+_level = OFF
+
+
+def set_level(level):
+    """Set the active level, either as an int or a name from LEVELS."""
+    global _level
+    if isinstance(level, str):
+        level = LEVELS.get(level.lower(), OFF)
+    _level = level
+
+
+def get_level() -> int:
+    return _level
+
+
+def enabled(level: int) -> bool:
+    return _level <= level
+
+
+def debug(*args):
+    if _level <= DEBUG:
+        print(*args)
+
+
+def info(*args):
+    if _level <= INFO:
+        print(*args)
+
+
+def warning(*args):
+    if _level <= WARNING:
+        print(*args)
+
+
+def error(*args):
+    if _level <= ERROR:
+        print(*args)
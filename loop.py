@@ -1,8 +1,14 @@
 from machine import Pin
-from typing import List, Optional
+try:
+    from typing import List, Optional
+except ImportError:
+    pass
 from file import Json
+import logger as log
 
 class Pedal:
+    __slots__ = ("id", "name")
+
     id: int
     name: str
 
@@ -10,11 +16,15 @@ class Pedal:
         self.id = id
         self.name = name
 
-        print('Init Pedal', name)
+        log.debug('Init Pedal', name)
 
+# Loops are lightweight views built by Patch.get_loops(), the patch itself
+# only keeps a bitmask of active loops.
 class Loop:
+    __slots__ = ("pedal", "order", "active")
+
     pedal: Pedal
-    active: bool = False
+    active: bool
     order: int
 
     def __init__(self, pedal: Pedal, order: int, active: bool = False):
@@ -22,13 +32,12 @@ class Loop:
         self.order = order
         self.active = active
 
-        print('Init Loop', pedal.name)
     def activate(self):
         self.active = True
 
     def deactivate(self):
         self.active = False
-        print(f'Loop {self.pedal.name} deactivated')
+        log.debug('Loop', self.pedal.name, 'deactivated')
 
     def get_css_class(self) -> str:
         return "enabled" if self.active else "disabled"
@@ -0,0 +1,196 @@
+import gc
+import time
+import uasyncio as asyncio
+import logger as log
+import metrics
+
+# Heap management policy for the event loop.
+#
+# - Collections are scheduled from idle_collector() when no command arrived
+#   for a while, instead of landing in the middle of a patch switch.
+# - gc.threshold() makes automatic collections happen early and small.
+# - critical() disables automatic collection for the command -> Patch.select
+#   section; if the heap is low a collection runs before entering it.
+# - Buffers that are needed for every request are allocated once here.
+
+HTTP_BUF_SIZE = 1024
+HTTP_POOL_SIZE = 4
+
+# Preallocated buffers, only touched from the event loop. HTTP handlers await
+# while holding theirs, so those come from a pool.
+_http_pool = [bytearray(HTTP_BUF_SIZE) for _ in range(HTTP_POOL_SIZE)]
+
+_idle_ms = 250             # quiet time before an idle collection
+_max_interval_ms = 10000   # force a collection at least this often
+_min_garbage = 4096        # bytes allocated since last collection worth collecting
+_critical_reserve = 8192   # free bytes required before entering critical()
+_probe_interval_ms = 60000 # how often /metrics re-measures the largest block
+
+_last_activity = 0
+_last_collect = 0
+_alloc_after_collect = 0
+_collections = 0
+_critical_collections = 0
+_http_pool_misses = 0
+
+# Last largest_free_block() sample, the probe itself costs a heap's worth
+_largest = 0
+_fragmentation = 0
+_probed_at = None
+
+
+def configure(cfg: dict):
+    """Apply the GC policy from network_config.json (all keys optional)."""
+    global _idle_ms, _max_interval_ms, _min_garbage, _critical_reserve, _probe_interval_ms
+    global _last_activity, _last_collect, _alloc_after_collect
+
+    _idle_ms = cfg.get("gc_idle_ms", _idle_ms)
+    _max_interval_ms = cfg.get("gc_max_interval_ms", _max_interval_ms)
+    _min_garbage = cfg.get("gc_min_garbage", _min_garbage)
+    _critical_reserve = cfg.get("gc_critical_reserve", _critical_reserve)
+    _probe_interval_ms = cfg.get("gc_probe_interval_ms", _probe_interval_ms)
+
+    heap = gc.mem_free() + gc.mem_alloc()
+    threshold = cfg.get("gc_threshold", heap // 8)
+    try:
+        gc.threshold(threshold)
+    except AttributeError:
+        pass
+
+    _last_activity = time.ticks_ms()
+    _last_collect = _last_activity
+    _alloc_after_collect = gc.mem_alloc()
+    log.info("GC policy: threshold", threshold, "idle", _idle_ms, "ms")
+
+
+def acquire_http_buf() -> bytearray:
+    """Take a request buffer from the pool, a new one when all are in use.
+
+    Admission caps max_http at HTTP_POOL_SIZE, so the fallback is a safety
+    net for callers outside that cap; it is counted on /metrics.
+    """
+    global _http_pool_misses
+    if _http_pool:
+        return _http_pool.pop()
+    _http_pool_misses += 1
+    return bytearray(HTTP_BUF_SIZE)
+
+
+def release_http_buf(buf: bytearray):
+    if buf is None:
+        raise ValueError("no HTTP buffer to release")
+    # Buffers allocated past the pool are left to the collector
+    if len(_http_pool) < HTTP_POOL_SIZE:
+        _http_pool.append(buf)
+
+
+def note_activity():
+    """Called for every command so idle collections keep out of its way."""
+    global _last_activity
+    _last_activity = time.ticks_ms()
+
+
+def collect():
+    global _last_collect, _alloc_after_collect, _collections
+    metrics.collect()
+    _collections += 1
+    _last_collect = time.ticks_ms()
+    _alloc_after_collect = gc.mem_alloc()
+
+
+class _Critical:
+    """Context manager keeping the garbage collector out of a code section.
+
+    A single instance is reused so entering it does not allocate. Sections
+    may nest; the GC state found on the outermost entry is restored on its
+    exit, so a caller that had disabled the GC keeps it disabled.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.was_enabled = True
+
+    def __enter__(self):
+        global _critical_collections
+        if self.depth == 0:
+            self.was_enabled = gc.isenabled()
+            if gc.mem_free() < _critical_reserve:
+                _critical_collections += 1
+                collect()
+            gc.disable()
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if self.depth == 0 and self.was_enabled:
+            gc.enable()
+        return False
+
+
+_critical = _Critical()
+
+
+def critical() -> _Critical:
+    note_activity()
+    return _critical
+
+
+async def idle_collector(poll_ms: int = 50):
+    """Collect garbage while nobody is switching patches."""
+    log.info("Idle GC task started")
+    while True:
+        await asyncio.sleep_ms(poll_ms)
+        now = time.ticks_ms()
+        if time.ticks_diff(now, _last_activity) < _idle_ms:
+            continue
+        garbage = gc.mem_alloc() - _alloc_after_collect
+        overdue = time.ticks_diff(now, _last_collect) >= _max_interval_ms
+        if garbage >= _min_garbage or overdue:
+            collect()
+
+
+def largest_free_block() -> int:
+    """Approximate the largest allocatable block, in 1/8ths of free heap.
+
+    Only used for reporting; the successful probe becomes garbage, so the
+    caller should collect() afterwards.
+    """
+    free = gc.mem_free()
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for eighths in range(8, 0, -1):
+            size = free * eighths // 8
+            try:
+                bytearray(size)
+                return size
+            except MemoryError:
+                pass
+        return 0
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def render() -> str:
+    """Heap report appended to the /metrics output.
+
+    The largest free block is re-measured at most every gc_probe_interval_ms,
+    scrapes in between report the last sample.
+    """
+    global _largest, _fragmentation, _probed_at
+    now = time.ticks_ms()
+    if _probed_at is None or time.ticks_diff(now, _probed_at) >= _probe_interval_ms:
+        free = gc.mem_free()
+        _largest = largest_free_block()
+        collect()
+        _fragmentation = 100 - (_largest * 100 // free) if free else 0
+        _probed_at = now
+    return (
+        f"heap_largest_free_block_bytes {_largest}\n"
+        f"heap_fragmentation_percent {_fragmentation}\n"
+        f"gc_collections_total {_collections}\n"
+        f"gc_critical_collections_total {_critical_collections}\n"
+        f"http_buffer_pool_misses_total {_http_pool_misses}\n"
+    )
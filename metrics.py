@@ -0,0 +1,144 @@
+import gc
+import time
+from array import array
+
+# Hot-path instrumentation: ticks_us spans, counters and fixed-size histograms.
+#
+# Everything is preallocated at import time so recording a sample never
+# allocates. When disabled every entry point returns immediately; call
+# enable() (driven by "metrics": true in network_config.json) to turn it on.
+
+# ---------- Histograms ----------
+COMMAND = 0        # command packet -> patch applied
+FLASH_WRITE = 1    # Json.save_to_file
+SSE_FANOUT = 2     # one broadcast to all SSE clients
+GC_PAUSE = 3       # gc.collect() duration
+CLOCK_JITTER = 4   # lateness of MIDI clock pulses
+EXPRESSION = 5     # one expression pedal sampling tick
+
+HISTOGRAM_NAMES = (
+    "command_latency_us",
+    "flash_write_us",
+    "sse_fanout_us",
+    "gc_pause_us",
+    "midi_clock_jitter_us",
+    "expression_tick_us",
+)
+
+# Upper bounds of the histogram buckets in microseconds, the last bucket is +Inf
+BUCKETS_US = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+_N_HIST = len(HISTOGRAM_NAMES)
+_N_BUCKETS = len(BUCKETS_US) + 1
+
+_buckets = array("L", [0] * (_N_HIST * _N_BUCKETS))
+_count = array("L", [0] * _N_HIST)
+_sum = array("L", [0] * _N_HIST)  # wraps after ~71 minutes of accumulated time
+_max = array("L", [0] * _N_HIST)
+
+# ---------- Counters ----------
+FLASH_WRITES = 0
+MIDI_BYTES = 1
+COMMANDS = 2
+SSE_MESSAGES = 3
+EXPRESSION_CC = 4
+
+COUNTER_NAMES = (
+    "flash_writes_total",
+    "midi_bytes_sent_total",
+    "commands_total",
+    "sse_messages_total",
+    "expression_cc_total",
+)
+
+_counters = array("L", [0] * len(COUNTER_NAMES))
+
+_enabled = False
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def start() -> int:
+    """Open a span, returns the start timestamp (0 when disabled)."""
+    if not _enabled:
+        return 0
+    return time.ticks_us()
+
+
+def stop(histogram: int, t0: int):
+    """Close a span opened with start() and record it in histogram."""
+    if not _enabled:
+        return
+    observe(histogram, time.ticks_diff(time.ticks_us(), t0))
+
+
+def observe(histogram: int, value_us: int):
+    if not _enabled:
+        return
+    bucket = 0
+    for bound in BUCKETS_US:
+        if value_us <= bound:
+            break
+        bucket += 1
+    _buckets[histogram * _N_BUCKETS + bucket] += 1
+    _count[histogram] += 1
+    _sum[histogram] = (_sum[histogram] + value_us) & 0xFFFFFFFF
+    if value_us > _max[histogram]:
+        _max[histogram] = value_us
+
+
+def inc(counter: int, amount: int = 1):
+    if not _enabled:
+        return
+    _counters[counter] += amount
+
+
+def collect() -> int:
+    """Run gc.collect() and record the pause, returns the pause in us."""
+    t0 = time.ticks_us()
+    gc.collect()
+    pause = time.ticks_diff(time.ticks_us(), t0)
+    observe(GC_PAUSE, pause)
+    return pause
+
+
+def reset():
+    for arr in (_buckets, _count, _sum, _max, _counters):
+        for i in range(len(arr)):
+            arr[i] = 0
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format.
+
+    Only called from the /metrics endpoint, so allocating here is fine.
+    """
+    lines = [
+        f"metrics_enabled {1 if _enabled else 0}",
+        f"heap_free_bytes {gc.mem_free()}",
+        f"heap_alloc_bytes {gc.mem_alloc()}",
+    ]
+
+    for i, name in enumerate(COUNTER_NAMES):
+        lines.append(f"{name} {_counters[i]}")
+
+    for h, name in enumerate(HISTOGRAM_NAMES):
+        cumulative = 0
+        base = h * _N_BUCKETS
+        for b, bound in enumerate(BUCKETS_US):
+            cumulative += _buckets[base + b]
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += _buckets[base + _N_BUCKETS - 1]
+        lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum {_sum[h]}")
+        lines.append(f"{name}_count {_count[h]}")
+        lines.append(f"{name}_max {_max[h]}")
+
+    return "\n".join(lines) + "\n"
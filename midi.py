@@ -1,6 +1,14 @@
 from file import Json
+import logger as log
+import metrics
 from machine import UART, Pin
 
+# System real-time messages, single bytes that may be sent at any time
+CLOCK = b"\xF8"
+START = b"\xFA"
+CONTINUE = b"\xFB"
+STOP = b"\xFC"
+
 class Midi:
     
     uart: UART
@@ -12,16 +20,68 @@ class Midi:
         tx_pin = file.data.get("midiPin", 0)
         self.uart = UART(1, baudrate=31250, tx=Pin(tx_pin))
 
+        # Reused message buffers so sending does not allocate
+        self._pc = bytearray(2)
+        self._cc = bytearray(3)
+        self._cc_data = memoryview(self._cc)[1:]
+        # Status byte of the last channel message, for running status
+        self._status = 0
+
     def send_pc(self, channel, program):
-        status = 0xC0 | ((channel - 1) & 0x0F)
-        self.uart.write(bytes([status, program & 0x7F]))
-        print(f'Sent MIDI Program Change - Channel: {channel}, Program: {program}')
+        self._pc[0] = 0xC0 | ((channel - 1) & 0x0F)
+        self._pc[1] = program & 0x7F
+        self._status = self._pc[0]
+        self.uart.write(self._pc)
+        metrics.inc(metrics.MIDI_BYTES, 2)
+        log.debug('Sent MIDI Program Change - Channel:', channel, 'Program:', program)
+
+    def send_cc(self, channel, controller, value):
+        self._cc[0] = 0xB0 | ((channel - 1) & 0x0F)
+        self._cc[1] = controller & 0x7F
+        self._cc[2] = value & 0x7F
+        self._status = self._cc[0]
+        self.uart.write(self._cc)
+        metrics.inc(metrics.MIDI_BYTES, 3)
+        log.debug('Sent MIDI Control Change - Channel:', channel, 'Controller:', controller, 'Value:', value)
+
+    def send_cc_running(self, channel, controller, value):
+        """Control Change that omits the status byte when it repeats.
+
+        Meant for continuous streams like expression pedals, a sweep on one
+        controller costs 2 bytes per value instead of 3. Real-time bytes in
+        between do not cancel running status.
+        """
+        status = 0xB0 | ((channel - 1) & 0x0F)
+        if status != self._status:
+            self.send_cc(channel, controller, value)
+            return
+        self._cc[1] = controller & 0x7F
+        self._cc[2] = value & 0x7F
+        self.uart.write(self._cc_data)
+        metrics.inc(metrics.MIDI_BYTES, 2)
+
+    def tx_idle(self) -> bool:
+        """True once everything written so far has left the UART."""
+        return self.uart.txdone()
+
+    def send_realtime(self, message: bytes):
+        self.uart.write(message)
+        metrics.inc(metrics.MIDI_BYTES, 1)
+
+    def send_start(self):
+        self.send_realtime(START)
+        log.debug('Sent MIDI Start')
+
+    def send_stop(self):
+        self.send_realtime(STOP)
+        log.debug('Sent MIDI Stop')
 
 class Midi_preset:
+    __slots__ = ("channel", "program")
 
     channel: int
     program: int
 
     def __init__(self, channel: int, program: int):
         self.channel = channel
-        self.program = program
\ No newline at end of file
+        self.program = program
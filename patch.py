@@ -1,108 +1,219 @@
-from typing import List, Optional
-from file import Json
+try:
+    from typing import List, Optional
+except ImportError:
+    pass
+from journal import StateStore
 from loop import Loop, Pedal
 from midi import Midi, Midi_preset
 from footswitch import FootSwitch
+import logger as log
+
+def pack_midi(entries) -> tuple:
+    """Pack MIDI config entries into (program changes, control changes).
+
+    Program changes are channel/program byte pairs, control changes are
+    channel/controller/value byte triples.
+    """
+    midi_data = bytearray()
+    cc_data = bytearray()
+    for midiPresetConfig in entries:
+        # Support both dict entries like {"channel":1, "program":2}
+        # and list/tuple entries like [1, 2]
+        # Control changes are dicts like {"channel":1, "cc":7, "value":100}
+        channel = None
+        program = None
+
+        if isinstance(midiPresetConfig, dict) and "cc" in midiPresetConfig:
+            cc_data.append(int(midiPresetConfig.get("channel", 1)) & 0xFF)
+            cc_data.append(int(midiPresetConfig["cc"]) & 0x7F)
+            cc_data.append(int(midiPresetConfig.get("value", 0)) & 0x7F)
+            log.debug('  Midi CC', midiPresetConfig)
+            continue
+        elif isinstance(midiPresetConfig, dict):
+            channel = midiPresetConfig.get("channel")
+            program = midiPresetConfig.get("program")
+        elif isinstance(midiPresetConfig, (list, tuple)) and len(midiPresetConfig) >= 2:
+            channel, program = midiPresetConfig[0], midiPresetConfig[1]
+        else:
+            # Skip malformed entries
+            log.warning('Warning: skipping malformed midi preset:', midiPresetConfig)
+            continue
+
+        # Fallbacks if values are missing
+        if channel is None:
+            channel = 1
+        if program is None:
+            program = 0
+
+        midi_data.append(int(channel) & 0xFF)
+        midi_data.append(int(program) & 0xFF)
+        log.debug('  Midi Preset channel', channel, 'program:', program)
+    return bytes(midi_data), bytes(cc_data)
+
+
+def send_midi(midi: Midi, midi_data: bytes, cc_data: bytes):
+    for i in range(0, len(midi_data), 2):
+        midi.send_pc(midi_data[i], midi_data[i + 1])
+
+    for i in range(0, len(cc_data), 3):
+        midi.send_cc(cc_data[i], cc_data[i + 1], cc_data[i + 2])
+
 
 class Patch:
+    # Loops and footswitches are stored as bitmasks (bit i = pedal/switch i)
+    # and MIDI presets as packed channel/program byte pairs. Loop and
+    # Midi_preset objects are only built as views when asked for.
+    # loop_order holds the active pedal indices in signal chain order and
+    # routing the write set the router compiled from it.
+    __slots__ = ("name", "footSwitch", "midi", "router", "pedalList", "loop_mask", "loop_order", "routing", "switch_mask", "midi_data", "cc_data", "expression", "bpm", "active")
+
     name: str
     footSwitch: FootSwitch
-    midiPresets: List[Midi_preset] = []
     midi: Midi
-    loops: List = [Loop]
-    active: bool = False
-
-    def __init__(self, patch_data, footSwitch: FootSwitch, active: bool = False, pedalList: List[Pedal] = []):
+    router: Optional["Router"]
+    pedalList: List[Pedal]
+    loop_mask: int
+    loop_order: bytes
+    switch_mask: int
+    midi_data: bytes
+    cc_data: bytes
+    expression: Optional[dict]
+    bpm: int
+    active: bool
+
+    def __init__(self, patch_data, footSwitch: FootSwitch, active: bool = False, pedalList: List[Pedal] = [], midi: Optional[Midi] = None, router: Optional["Router"] = None):
         self.name = patch_data.get("name", "")
         self.footSwitch = footSwitch
         self.active = active
-        self.midi = Midi()
-        self.midiPresets = []
-        self.switchStatusList = list(map(bool, patch_data.get("footswitch", [])))
-        self.loops = []  
-
-        print(f'Init Patch {self.name}: ')
-
-        for pedal in pedalList:
-            if pedal.id in patch_data.get("loops", []):
-                loop = Loop(pedal=pedal, order=pedal.id, active=True)
-                self.loops.append(loop)
-                print(f'  Loop {pedal.name} activated')
-            else:
-                loop = Loop(pedal=pedal, order=pedal.id, active=False)
-                self.loops.append(loop)
-                print(f'  Loop {pedal.name} deactivated')
-
-        for midiPresetConfig in patch_data.get("midi", []):
-            # Support both dict entries like {"channel":1, "program":2}
-            # and list/tuple entries like [1, 2]
-            channel = None
-            program = None
-
-            if isinstance(midiPresetConfig, dict):
-                channel = midiPresetConfig.get("channel")
-                program = midiPresetConfig.get("program")
-            elif isinstance(midiPresetConfig, (list, tuple)) and len(midiPresetConfig) >= 2:
-                channel, program = midiPresetConfig[0], midiPresetConfig[1]
-            else:
-                # Skip malformed entries
-                print(f"Warning: skipping malformed midi preset: {midiPresetConfig}")
-                continue
+        self.midi = midi if midi is not None else Midi()
+        self.router = router
+        self.pedalList = pedalList
+        self.bpm = patch_data.get("bpm", 0)
 
-            # Fallbacks if values are missing
-            if channel is None:
-                channel = 1
-            if program is None:
-                program = 0
+        log.debug('Init Patch', self.name)
 
-            midiPreset = Midi_preset(channel=int(channel), program=int(program))
-            self.midiPresets.append(midiPreset)
-            print(f'  Midi Preset channel {midiPreset.channel} program: {midiPreset.program}')
+        self.switch_mask = 0
+        for i, status in enumerate(patch_data.get("footswitch", [])):
+            if status:
+                self.switch_mask |= 1 << i
+
+        # The order of "loops" is the order of the pedals in the chain
+        index_of = {pedal.id: i for i, pedal in enumerate(pedalList)}
+        self.loop_mask = 0
+        order = bytearray()
+        for pedal_id in patch_data.get("loops", []):
+            i = index_of.get(pedal_id)
+            if i is None:
+                log.warning('  Unknown pedal', pedal_id, 'in patch', self.name)
+                continue
+            if self.loop_mask & (1 << i):
+                log.warning('  Pedal', pedal_id, 'listed twice in patch', self.name)
+                continue
+            self.loop_mask |= 1 << i
+            order.append(i)
+            log.debug('  Loop', pedalList[i].name, 'activated')
+        self.loop_order = bytes(order)
+        self.routing = router.compile(self.name, self.loop_order) if router else None
+
+        self.midi_data, self.cc_data = pack_midi(patch_data.get("midi", []))
+        self.expression = None
+        if patch_data.get("expression"):
+            # Only configs with expression pedals pay for the module
+            from expression import compile_mappings
+            self.expression = compile_mappings(patch_data["expression"])
 
 
     def select(self):
-    
-        for status, switch in zip(self.switchStatusList, self.footSwitch.get_footswitch()):
-            if status:
+        if self.router:
+            self.router.apply(self.routing)
+
+        for i, switch in enumerate(self.footSwitch.get_footswitch()):
+            if self.switch_mask & (1 << i):
                 switch.activate()
             else:
                 switch.deactivate()
 
-        for midiPreset in self.midiPresets:
-            self.midi.send_pc(midiPreset.channel, midiPreset.program)
+        send_midi(self.midi, self.midi_data, self.cc_data)
 
-    def activate(self, file: Json, index: int):
+    def activate(self, file: StateStore, index: int, persist: bool = True):
         self.active = True
-        file.save_to_file("active_patch_index", index)
+        if persist:
+            file.save_to_file("active_patch_index", index)
+        else:
+            file.set("active_patch_index", index)
 
     def deactivate(self):
         self.active = False
 
+    def is_loop_active(self, index: int) -> bool:
+        return bool(self.loop_mask & (1 << index))
+
+    def is_switch_active(self, index: int) -> bool:
+        return bool(self.switch_mask & (1 << index))
+
     def get_loops(self) -> List[Loop]:
-        return self.loops
+        # order is the 1-based position in the chain, 0 for bypassed loops
+        return [
+            Loop(pedal=pedal, order=self.loop_order.find(bytes((i,))) + 1, active=bool(self.loop_mask & (1 << i)))
+            for i, pedal in enumerate(self.pedalList)
+        ]
+
+    def get_midi_presets(self) -> List[Midi_preset]:
+        data = self.midi_data
+        return [Midi_preset(channel=data[i], program=data[i + 1]) for i in range(0, len(data), 2)]
 
     def get_midi_list(self) -> List[dict]:
-        return [{"channel": preset.channel, "program": preset.program} for preset in self.midiPresets]
+        data = self.midi_data
+        return [{"channel": data[i], "program": data[i + 1]} for i in range(0, len(data), 2)]
 
     def get_midi_list_html(self) -> str:
         html = "<ul>"
-        for midiPreset in self.midiPresets:
-            html += f"<li>Channel: {midiPreset.channel}, Program: {midiPreset.program}</li>"
+        data = self.midi_data
+        for i in range(0, len(data), 2):
+            html += f"<li>Channel: {data[i]}, Program: {data[i + 1]}</li>"
         html += "</ul>"
         return html
 
+class SequenceStep:
+    __slots__ = ("patch_index", "delay_us", "midi_data", "cc_data")
+
+    def __init__(self, step_data):
+        self.patch_index = step_data.get("patch", 0)
+        # Delay is counted from the previous step
+        self.delay_us = int(step_data.get("delay_ms", 0) * 1000)
+        self.midi_data, self.cc_data = pack_midi(step_data.get("midi", []))
+
+class Sequence:
+    __slots__ = ("name", "steps")
+
+    name: str
+    steps: List[SequenceStep]
+
+    def __init__(self, sequence_data):
+        self.name = sequence_data.get("name", "")
+        self.steps = [SequenceStep(step) for step in sequence_data.get("steps", [])]
+
 class Bank:
+    # active_index is the position of the active patch, -1 when none is
+    __slots__ = ("name", "patches", "sequences", "active", "active_index")
 
     name: str
-    patches: List[Patch] = []
-    active: bool = False
-    
-    def __init__(self, name: str, patches: List[Patch], active: bool = False):
+    patches: List[Patch]
+    sequences: List[Sequence]
+    active: bool
+    active_index: int
+
+    def __init__(self, name: str, patches: List[Patch], active: bool = False, sequences: Optional[List[Sequence]] = None):
         self.name = name
         self.patches = patches
+        self.sequences = sequences or []
         self.active = active
+        self.active_index = -1
+        for position, patch in enumerate(patches):
+            if patch.active:
+                self.active_index = position
 
-    def activate(self, file: Json, index: int):
+    def activate(self, file: StateStore, index: int):
         self.active = True
         file.save_to_file("active_bank_index", index)
 
@@ -110,8 +221,15 @@ class Bank:
         self.active = False
 
     def get_patch_by_index(self, index: int) -> Optional[Patch]:
-        return self.patches[index]
+        if 0 <= index < len(self.patches):
+            return self.patches[index]
+        return None
     
+    def set_active_index(self, index: int):
+        self.active_index = index
+
     def get_active_patch(self) -> Optional[Patch]:
-        return next((patch for patch in self.patches if patch.active), None)
+        if self.active_index < 0:
+            return None
+        return self.patches[self.active_index]
     
\ No newline at end of file
@@ -0,0 +1,25 @@
+# GPIO ownership shared by the optional hardware.
+#
+# Routing and the expression inputs are configured independently in
+# config.json, so their pins are checked against each other and against the
+# footswitches, MIDI output and LCD here, before any of them is driven.
+
+
+def reserved_pins(config: dict) -> dict:
+    """GPIOs already used by other hardware, mapped to their owner."""
+    pins = {}
+    for name, pin in config.get("footswitch", {}).items():
+        pins[pin] = f"footswitch {name}"
+    if "midiPin" in config:
+        pins[config["midiPin"]] = "MIDI"
+    lcd = config.get("lcd")
+    if lcd:
+        pins[lcd.get("sda", 0)] = "LCD sda"
+        pins[lcd.get("scl", 1)] = "LCD scl"
+    for entry in config.get("expression", {}).get("inputs", []):
+        pin = entry.get("pin", 26)
+        owner = f"expression {entry.get('name', 'exp')}"
+        if pin in pins:
+            raise ValueError(f"pins: {owner} GPIO {pin} already used by {pins[pin]}")
+        pins[pin] = owner
+    return pins
@@ -0,0 +1,153 @@
+import struct
+import time
+import uasyncio as asyncio
+from machine import disable_irq, enable_irq
+import logger as log
+
+# Command recorder: every footswitch and web UI command with its source and
+# time, kept in a ring of fixed-size records in one flash file so the
+# traffic of a gig can be replayed at home with tools/replay.py.
+#
+#     seq:u32 | time_ms:u32 | source:u8 | length:u8 | data (14 bytes)
+#
+# seq grows across reboots and finds the newest record after a restart;
+# time_ms counts from the boot, which is marked by a SOURCE_BOOT record.
+# Recording only copies into a RAM buffer, a background task writes it out
+# once a second so flash writes stay off the command path.
+
+RECORD_SIZE = 24
+_HEADER = "<IIBB"
+_HEADER_SIZE = 10
+MAX_DATA = RECORD_SIZE - _HEADER_SIZE
+
+# Records held in RAM between flushes
+BUFFER_RECORDS = 32
+FLUSH_MS = 1000
+
+
+class Recorder:
+    SOURCE_UDP: int = 0
+    SOURCE_BLE: int = 1
+    SOURCE_HTTP: int = 2
+    SOURCE_BOOT: int = 0xFF
+
+    def __init__(self, records: int, fileName: str = "commands.rec"):
+        self.records = records
+        self.fileName = fileName
+        self.buf = bytearray(BUFFER_RECORDS * RECORD_SIZE)
+        self.pending = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.seq = 0
+        self.position = 0
+        self.start = time.ticks_ms()
+        self._open()
+        self.record(self.SOURCE_BOOT, b"")
+
+    def _open(self):
+        """Find the newest record, or create the ring file on first use.
+
+        The ring can be far larger than the heap allows in one piece, so the
+        seq fields are scanned through the record buffer, which is empty
+        until the boot record.
+        """
+        size = self.records * RECORD_SIZE
+        buf = self.buf
+        view = memoryview(buf)
+        scanned = 0
+        extra = b""
+        newest = 0
+        position = 0
+        try:
+            with open(self.fileName, "rb") as f:
+                while scanned < size:
+                    count = f.readinto(view[:min(len(buf), size - scanned)])
+                    if not count:
+                        break
+                    for offset in range(0, count - RECORD_SIZE + 1, RECORD_SIZE):
+                        seq = struct.unpack_from("<I", buf, offset)[0]
+                        if seq > newest:
+                            newest = seq
+                            position = (scanned + offset) // RECORD_SIZE + 1
+                    scanned += count
+                extra = f.read(1)
+        except OSError:
+            scanned = -1
+
+        for i in range(len(buf)):
+            buf[i] = 0
+
+        if scanned != size or extra:
+            # New or resized ring, start over
+            with open(self.fileName, "wb") as f:
+                remaining = size
+                while remaining:
+                    count = min(remaining, len(buf))
+                    f.write(view[:count])
+                    remaining -= count
+            log.info("Command recording started in", self.fileName)
+            return
+
+        self.seq = newest
+        self.position = position % self.records
+        log.info("Command recording resumed at record", self.seq)
+
+    def record(self, source: int, data):
+        # Called from the event loop and the BLE IRQ: take the slot and the
+        # seq with IRQs off so two records never share either
+        state = disable_irq()
+        if self.pending == BUFFER_RECORDS:
+            self.dropped += 1
+            enable_irq(state)
+            return
+        offset = self.pending * RECORD_SIZE
+        self.pending += 1
+        self.seq += 1
+        seq = self.seq
+        self.recorded += 1
+        enable_irq(state)
+
+        length = min(len(data), MAX_DATA)
+        struct.pack_into(_HEADER, self.buf, offset, seq, time.ticks_diff(time.ticks_ms(), self.start), source, length)
+        offset += _HEADER_SIZE
+        for i in range(length):
+            self.buf[offset + i] = data[i]
+
+    def flush(self):
+        # record() also runs from the BLE IRQ, which can fire while the file
+        # is written: write the records pending on entry, keep later ones
+        count = self.pending
+        if not count:
+            return
+        view = memoryview(self.buf)
+        with open(self.fileName, "r+b") as f:
+            written = 0
+            while written < count:
+                # Up to the end of the ring, then wrap to the start
+                chunk = min(count - written, self.records - self.position)
+                f.seek(self.position * RECORD_SIZE)
+                f.write(view[written * RECORD_SIZE:(written + chunk) * RECORD_SIZE])
+                written += chunk
+                self.position = (self.position + chunk) % self.records
+
+        state = disable_irq()
+        late = self.pending - count
+        if late:
+            view[:late * RECORD_SIZE] = view[count * RECORD_SIZE:self.pending * RECORD_SIZE]
+        self.pending = late
+        enable_irq(state)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep_ms(FLUSH_MS)
+            try:
+                self.flush()
+            except OSError as e:
+                log.error("Command recording failed:", e)
+
+    def render(self) -> str:
+        """Report appended to the /metrics output."""
+        return (
+            f"recorded_commands_total {self.recorded}\n"
+            f"recorded_commands_dropped_total {self.dropped}\n"
+        )
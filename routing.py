@@ -0,0 +1,177 @@
+from machine import Pin, SPI, mem32
+try:
+    from typing import List, Optional
+except ImportError:
+    pass
+from loop import Pedal
+from pins import reserved_pins
+import logger as log
+
+# Loop routing: turns a patch's loop list into the hardware state that puts
+# those pedals in the signal chain, in that order.
+#
+# "routing" in config.json selects the hardware:
+#
+#   relay   one true-bypass relay per pedal, fixed order on the board
+#           {"mode": "relay", "relays": {"<pedal id>": <gpio>, ...}, "active_low": false}
+#
+#   matrix  crosspoint switch matrix behind a chain of shift registers,
+#           any pedal order
+#           {"mode": "matrix", "spi": 0, "sck": 18, "mosi": 19, "latch": 17,
+#            "ports": {"<pedal id>": <port>, ...}, "size": 8}
+#
+# Every patch is compiled at load time into a write set: for relays the
+# output value of the relay GPIOs, toggled into place by a single write to
+# the SIO XOR register, for the matrix the bytes shifted out before one
+# latch pulse. Either way all loops switch at the same instant, without
+# passing through half-routed states.
+
+# RP2040 single-cycle IO block
+_SIO_BASE = 0xD0000000
+_GPIO_OUT = _SIO_BASE + 0x010
+_GPIO_OUT_XOR = _SIO_BASE + 0x01C
+
+_MAX_GPIO = 28
+
+
+def _pedal_map(mapping: dict, pedalList: List[Pedal], what: str) -> dict:
+    """Convert {"<pedal id>": value} to {pedal index: value}."""
+    index_of = {pedal.id: i for i, pedal in enumerate(pedalList)}
+    result = {}
+    for key, value in mapping.items():
+        pedal_id = int(key)
+        if pedal_id not in index_of:
+            raise ValueError(f"routing: {what} for unknown pedal {pedal_id}")
+        result[index_of[pedal_id]] = value
+    return result
+
+
+class Router:
+    """Base class, subclasses provide compile(name, order), run at load time,
+    and write(write_set), called by apply() on patch changes."""
+
+    def __init__(self):
+        self.applied = None
+
+    def apply(self, write_set):
+        # Nothing to switch when the hardware already is in this state;
+        # compared by value, equal ints or bytes need not be the same object
+        if write_set == self.applied:
+            return
+        self.write(write_set)
+        self.applied = write_set
+
+
+class RelayRouter(Router):
+
+    def __init__(self, cfg: dict, pedalList: List[Pedal], reserved: dict):
+        super().__init__()
+        self.pins = _pedal_map(cfg.get("relays", {}), pedalList, "relay")
+        self.active_low = cfg.get("active_low", False)
+
+        seen = {}
+        for index, pin in self.pins.items():
+            if not 0 <= pin <= _MAX_GPIO:
+                raise ValueError(f"routing: relay GPIO {pin} out of range")
+            if pin in reserved:
+                raise ValueError(f"routing: relay GPIO {pin} already used by {reserved[pin]}")
+            if pin in seen:
+                raise ValueError(f"routing: relay GPIO {pin} shared by two pedals")
+            seen[pin] = index
+
+        self.all_mask = 0
+        for pin in self.pins.values():
+            self.all_mask |= 1 << pin
+        # Everything bypassed until the first patch is applied
+        idle = self.all_mask if self.active_low else 0
+        for pin in self.pins.values():
+            Pin(pin, Pin.OUT, value=(idle >> pin) & 1)
+
+    def compile(self, name: str, order: bytes):
+        on = 0
+        if list(order) != sorted(order):
+            log.warning("Patch", name, "loop order ignored, relays switch in board order")
+        for index in order:
+            if index not in self.pins:
+                log.warning("Patch", name, "uses a pedal without relay, ignored")
+                continue
+            on |= 1 << self.pins[index]
+        if self.active_low:
+            return self.all_mask & ~on
+        return on
+
+    def write(self, write_set):
+        # Flip only the relay pins that differ, all of them in one store
+        mem32[_GPIO_OUT_XOR] = (mem32[_GPIO_OUT] ^ write_set) & self.all_mask
+
+
+class MatrixRouter(Router):
+    """size pedal ports plus the guitar/amp port, one crosspoint per pair.
+
+    Bit (destination * (size + 1) + source) connects a source to a
+    destination; port size is the guitar input as a source and the amp
+    output as a destination. The register chain is shifted MSB first, so
+    the last byte holds crosspoints 0-7.
+    """
+
+    def __init__(self, cfg: dict, pedalList: List[Pedal], reserved: dict):
+        super().__init__()
+        self.size = cfg.get("size", len(pedalList))
+        self.ports = _pedal_map(cfg.get("ports", {}), pedalList, "matrix port")
+
+        seen = {}
+        for index, port in self.ports.items():
+            if not 0 <= port < self.size:
+                raise ValueError(f"routing: matrix port {port} out of range")
+            if port in seen:
+                raise ValueError(f"routing: matrix port {port} shared by two pedals")
+            seen[port] = index
+
+        for key in ("sck", "mosi", "latch"):
+            pin = cfg.get(key)
+            if pin is None:
+                raise ValueError(f"routing: matrix needs a {key} pin")
+            if pin in reserved:
+                raise ValueError(f"routing: matrix {key} GPIO {pin} already used by {reserved[pin]}")
+
+        self.bits = (self.size + 1) * (self.size + 1)
+        self.spi = SPI(cfg.get("spi", 0), baudrate=1000000, sck=Pin(cfg["sck"]), mosi=Pin(cfg["mosi"]))
+        self.latch = Pin(cfg["latch"], Pin.OUT, value=0)
+
+    def compile(self, name: str, order: bytes):
+        chain = [self.size]
+        for index in order:
+            if index not in self.ports:
+                log.warning("Patch", name, "uses a pedal without matrix port, ignored")
+                continue
+            chain.append(self.ports[index])
+        chain.append(self.size)
+
+        frame = bytearray((self.bits + 7) // 8)
+        last = len(frame) - 1
+        for source, destination in zip(chain, chain[1:]):
+            bit = destination * (self.size + 1) + source
+            frame[last - bit // 8] |= 1 << (bit % 8)
+        return bytes(frame)
+
+    def write(self, write_set):
+        self.spi.write(write_set)
+        self.latch.value(1)
+        self.latch.value(0)
+
+
+def create_router(config: dict, pedalList: List[Pedal]) -> Optional[Router]:
+    """Router for the "routing" section of config.json, None without one."""
+    cfg = config.get("routing")
+    if not cfg:
+        return None
+    mode = cfg.get("mode", "relay")
+    reserved = reserved_pins(config)
+    if mode == "relay":
+        router = RelayRouter(cfg, pedalList, reserved)
+    elif mode == "matrix":
+        router = MatrixRouter(cfg, pedalList, reserved)
+    else:
+        raise ValueError(f"routing: unknown mode {mode}")
+    log.info("Loop routing:", mode)
+    return router
@@ -0,0 +1,90 @@
+import time
+import uasyncio as asyncio
+try:
+    from typing import Optional
+except ImportError:
+    pass
+from patch import Sequence, send_midi
+import logger as log
+import memory
+
+# Below this many microseconds to a step the scheduler stops sleeping in
+# milliseconds and just yields until the deadline
+_SPIN_US = 2000
+
+
+class Sequencer:
+    """Runs a bank's sequences: timed patch changes from a single command.
+
+    Step deadlines are absolute ticks_us times, each one the previous
+    deadline plus the step delay. Steps only persist the selection to flash
+    when the sequence ends or is cancelled, and a step whose patch is
+    already active only sends its MIDI extras.
+    """
+
+    def __init__(self, bankManager, on_step=None):
+        self.bankManager = bankManager
+        self.on_step = on_step
+        self.task = None
+        self.current: Optional[Sequence] = None
+        self._generation = 0
+
+    def is_running(self) -> bool:
+        return self.task is not None
+
+    def trigger(self, index: int) -> bool:
+        bank = self.bankManager.get_active_bank()
+        if bank is None or not (0 <= index < len(bank.sequences)):
+            log.warning("No sequence", index)
+            return False
+        self.cancel()
+        self._generation += 1
+        self.current = bank.sequences[index]
+        self.task = asyncio.create_task(self._run(self.current, self._generation))
+        log.info("Sequence started:", self.current.name)
+        return True
+
+    def cancel(self):
+        """Stop the running sequence, called for every manual command."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            log.info("Sequence cancelled")
+
+    async def _sleep_until(self, deadline: int):
+        while True:
+            remaining = time.ticks_diff(deadline, time.ticks_us())
+            if remaining <= 0:
+                return
+            if remaining > _SPIN_US:
+                await asyncio.sleep_ms((remaining - _SPIN_US) // 1000 + 1)
+            else:
+                await asyncio.sleep_ms(0)
+
+    async def _run(self, sequence: Sequence, generation: int):
+        bm = self.bankManager
+        bank = bm.get_active_bank()
+        persist_needed = False
+        try:
+            due = time.ticks_us()
+            for step in sequence.steps:
+                due = time.ticks_add(due, step.delay_us)
+                await self._sleep_until(due)
+
+                with memory.critical():
+                    patch = bank.get_patch_by_index(step.patch_index) if bank else None
+                    if patch is not None and not patch.active:
+                        bm.select_patch(step.patch_index, persist=False)
+                        persist_needed = True
+                    send_midi(bm.midi, step.midi_data, step.cc_data)
+
+                if self.on_step:
+                    self.on_step()
+            log.info("Sequence finished:", sequence.name)
+        finally:
+            if persist_needed:
+                bm.save_status()
+            # A cancelled run finishes after its replacement may have started
+            if generation == self._generation:
+                self.task = None
+                self.current = None
@@ -0,0 +1,161 @@
+import struct
+from binascii import crc32
+import logger as log
+
+# Catalog sync between the Core and the FootProxy.
+#
+# The catalog (bank and patch names) is split into blobs: a string table
+# holding every distinct name once, and one blob per bank made of string
+# indices. A manifest lists the crc32 of every blob and the catalog version
+# is the crc32 of the manifest, so an unchanged config keeps its version
+# across reboots.
+#
+# Transfers are pulled by the FootProxy one chunk at a time, each request
+# naming the blob, offset and the largest chunk its link can carry. The
+# request for the next chunk acknowledges the previous one, and a transfer
+# interrupted by a disconnect resumes from the last offset as long as the
+# version did not change. After a reconnect the FootProxy compares the
+# manifest with its own copy and only fetches the blobs whose crc differs.
+#
+#   FootProxy -> Core                     Core -> FootProxy
+#   0x10 HELLO version:u32                0x11 VERSION version:u32 banks:u8
+#   0x12 GET blob:u8 offset:u16 max:u8    0x13 CHUNK version:u32 blob:u8 offset:u16 total:u16 data
+#                                         0x14 CHANGED version:u32 (pushed after edits)
+#
+# blob 0xFF is the manifest (u32 crc per blob: table, bank 0, bank 1, ...),
+# 0xFE the string table (u8 length + UTF-8 per name) and 0..n-1 the banks
+# (u16 name index, u16 patch count, u16 name index per patch).
+#
+# Blob ids and offsets bound the catalog to 254 banks and 64 KB per blob.
+# A larger one turns sync off with an error in the log rather than keeping
+# the Core from booting: the FootProxy then sees an empty catalog.
+
+SYNC_HELLO = 0x10
+SYNC_VERSION = 0x11
+SYNC_GET = 0x12
+SYNC_CHUNK = 0x13
+SYNC_CHANGED = 0x14
+
+BLOB_MANIFEST = 0xFF
+BLOB_TABLE = 0xFE
+
+_CHUNK_HEADER = "<BIBHH"
+_CHUNK_HEADER_SIZE = 10
+MAX_PEERS = 4
+MAX_BANKS = BLOB_TABLE
+MAX_BLOB_SIZE = 0xFFFF
+
+
+class CatalogSync:
+
+    def __init__(self, bankManager):
+        self.bankManager = bankManager
+        self.blobs = {}
+        self.banks = 0
+        self.version = 0
+        # reply functions of the FootProxies that said hello, for CHANGED pushes
+        self.peers = {}
+        self.rebuild()
+
+    def rebuild(self) -> bool:
+        """Re-encode the catalog, returns True when the version changed."""
+        try:
+            blobs = self._encode()
+        except ValueError as e:
+            log.error("Catalog sync disabled:", e)
+            blobs = {}
+        return self._publish(blobs)
+
+    def _encode(self) -> dict:
+        banks = self.bankManager.banks
+        if len(banks) > MAX_BANKS:
+            raise ValueError(f"{len(banks)} banks, at most {MAX_BANKS}")
+        strings = []
+        index = {}
+
+        def intern(name: str) -> int:
+            if name not in index:
+                if len(strings) > 0xFFFF:
+                    raise ValueError("more than 65536 distinct names")
+                index[name] = len(strings)
+                strings.append(name)
+            return index[name]
+
+        blobs = {}
+        for bank_index, bank in enumerate(banks):
+            blob = bytearray(struct.pack("<HH", intern(bank.name), len(bank.patches)))
+            for patch in bank.patches:
+                blob.extend(struct.pack("<H", intern(patch.name)))
+            blobs[bank_index] = bytes(blob)
+
+        table = bytearray()
+        for name in strings:
+            encoded = name.encode()[:255]
+            table.append(len(encoded))
+            table.extend(encoded)
+        blobs[BLOB_TABLE] = bytes(table)
+
+        for key, blob in blobs.items():
+            if len(blob) > MAX_BLOB_SIZE:
+                raise ValueError(f"blob {key} is {len(blob)} bytes, at most {MAX_BLOB_SIZE}")
+        return blobs
+
+    def _publish(self, blobs: dict) -> bool:
+        # No blobs: sync is off, the version stays 0 with no banks to fetch
+        banks = len(blobs) - 1 if blobs else 0
+        version = 0
+        if blobs:
+            manifest = bytearray()
+            for key in [BLOB_TABLE] + list(range(banks)):
+                manifest.extend(struct.pack("<I", crc32(blobs[key]) & 0xFFFFFFFF))
+            blobs[BLOB_MANIFEST] = bytes(manifest)
+            version = crc32(manifest) & 0xFFFFFFFF
+
+        changed = version != self.version
+        self.blobs = blobs
+        self.banks = banks
+        self.version = version
+        log.info("Sync catalog version", version, "size", sum(len(b) for b in blobs.values()))
+        return changed
+
+    def catalog_changed(self):
+        """Call after bank or patch names were edited.
+
+        Nothing edits the catalog at runtime yet, config.json is only read at
+        boot. This is the hook for an editor, which must also call
+        BankCache.invalidate() so the UI views are rebuilt.
+        """
+        if self.rebuild():
+            message = struct.pack("<BI", SYNC_CHANGED, self.version)
+            for key, reply in list(self.peers.items()):
+                try:
+                    reply(message)
+                except Exception:
+                    del self.peers[key]
+
+    def handle(self, data, reply, peer=None) -> bool:
+        """Handle a sync message, returns False if data is not one."""
+        cmd = data[0]
+        if cmd == SYNC_HELLO:
+            if peer is not None:
+                if peer not in self.peers and len(self.peers) >= MAX_PEERS:
+                    del self.peers[next(iter(self.peers))]
+                self.peers[peer] = reply
+            reply(struct.pack("<BIB", SYNC_VERSION, self.version, self.banks))
+            return True
+
+        if cmd == SYNC_GET:
+            if len(data) < 5:
+                return True
+            blob_id = data[1]
+            offset = data[2] | (data[3] << 8)
+            max_data = data[4] - _CHUNK_HEADER_SIZE
+            blob = self.blobs.get(blob_id)
+            if blob is None or max_data <= 0:
+                log.warning("Sync GET for unknown blob", blob_id)
+                return True
+            chunk = blob[offset:offset + max_data]
+            reply(struct.pack(_CHUNK_HEADER, SYNC_CHUNK, self.version, blob_id, offset, len(blob)) + chunk)
+            return True
+
+        return False
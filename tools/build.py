@@ -0,0 +1,112 @@
+"""Build the Core firmware files for upload or freezing.
+
+Runs on the host (CPython 3.8+). Every module is copied with its guarded
+`typing` import removed (MicroPython ignores annotations, so nothing else
+needs it) and cross-compiled to .mpy, which the Pico loads without parsing or
+compiling source from flash:
+
+    pip install mpy-cross
+    python tools/build.py
+    mpremote cp -r build/device/. :
+
+build/device holds main.py, the .mpy modules and the data files, ready to
+copy to the board. build/src holds the stripped sources and
+build/manifest.py freezes them into a custom firmware image instead:
+
+    make -C ports/rp2 BOARD=RPI_PICO_W FROZEN_MANIFEST=<repo>/build/manifest.py
+
+With the modules frozen only main.py and the data files go on the board.
+"""
+import argparse
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUILD = ROOT / "build"
+
+# Stays source: MicroPython only runs main.py, never main.mpy
+ENTRY = "main.py"
+MODULE_DIRS = (".", "lib")
+DATA_FILES = ("config.json", "network_config.json", "index.html")
+
+# RP2040 is a Cortex-M0+
+MPY_ARCH = "armv6m"
+
+_TYPING = re.compile(r"^\s*(from typing import .*|import typing)\s*$")
+# The modules import typing in a try block, so they also run from source on
+# a board without a typing stub
+_TYPING_BLOCK = re.compile(r"^try:\n\s+(?:from typing import .*|import typing)\nexcept ImportError:\n\s+pass\n", re.M)
+
+
+def modules():
+    for directory in MODULE_DIRS:
+        for path in sorted((ROOT / directory).glob("*.py")):
+            if path.name != ENTRY:
+                yield path
+
+
+def strip_typing(source: str) -> str:
+    # Blank lines keep the line numbers of tracebacks matching the repo
+    source = _TYPING_BLOCK.sub(lambda m: "\n" * m.group(0).count("\n"), source)
+    return "\n".join("" if _TYPING.match(line) else line for line in source.split("\n"))
+
+
+def mpy_cross():
+    exe = shutil.which("mpy-cross")
+    if exe:
+        return [exe]
+    try:
+        import mpy_cross  # noqa: F401
+    except ImportError:
+        sys.exit("mpy-cross not found, install it with: pip install mpy-cross")
+    return [sys.executable, "-m", "mpy_cross"]
+
+
+def build(compile_mpy: bool = True):
+    shutil.rmtree(BUILD, ignore_errors=True)
+    src = BUILD / "src"
+    device = BUILD / "device"
+    src.mkdir(parents=True)
+    device.mkdir()
+    compiler = mpy_cross() if compile_mpy else None
+
+    for path in modules():
+        relative = path.relative_to(ROOT)
+        # Flat, lib/ is on sys.path on the board and frozen modules are top level
+        stripped = src / path.name
+        stripped.write_text(strip_typing(path.read_text()))
+
+        target = device / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if compiler:
+            target = target.with_suffix(".mpy")
+            # -s keeps tracebacks naming the module rather than build/src/...
+            subprocess.run(compiler + ["-march=" + MPY_ARCH, "-s", relative.as_posix(), "-o", str(target), str(stripped)], check=True)
+        else:
+            shutil.copy(stripped, target)
+        print(f"{relative} -> {target.relative_to(BUILD)}")
+
+    shutil.copy(ROOT / ENTRY, device / ENTRY)
+    for name in DATA_FILES:
+        if (ROOT / name).exists():
+            shutil.copy(ROOT / name, device / name)
+
+    (BUILD / "manifest.py").write_text(
+        'include("$(PORT_DIR)/boards/manifest.py")\n'
+        f'freeze("{src.as_posix()}")\n'
+    )
+    print(f"Build ready in {device.relative_to(ROOT)}, freeze manifest in build/manifest.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-mpy", action="store_true", help="copy stripped sources instead of compiling them")
+    args = parser.parse_args()
+    build(compile_mpy=not args.no_mpy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Host test of the command frame deduplication window.
+
+Runs transport.py on CPython (3.8+). Each trial plays a sender through a
+random link: every command is sent once or more, deliveries are reordered
+by up to --reorder places, now and then a copy of an old command turns up
+long after the window moved on, and the sender may reboot with a new
+session halfway. Every command must run exactly once:
+
+    python tools/dedup_check.py --trials 1000
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transport  # noqa: E402
+
+
+def regression():
+    """Retransmits of recent seqs after a stale frame must stay duplicates."""
+    dedup = transport.Deduplicator()
+    for seq in range(100, 131):
+        assert dedup.accept("peer", 7, seq)
+    problems = []
+    if dedup.accept("peer", 7, 105):
+        problems.append("stale seq 105 ran again")
+    for seq in (130, 129):
+        if dedup.accept("peer", 7, seq):
+            problems.append(f"retransmit of {seq} ran again")
+    if not dedup.accept("peer", 8, 105):
+        problems.append("new session was rejected")
+    return problems
+
+
+def trial(rng, commands, reorder):
+    dedup = transport.Deduplicator()
+    sent = []  # (session, seq) of every command, in order
+    packets = []  # (delivery slot, session, seq)
+    reboot = rng.randrange(commands) if rng.random() < 0.5 else None
+    session = rng.randrange(1 << 24)
+    seq = rng.randrange(65536)
+    slot = 0
+
+    for number in range(commands):
+        if number == reboot:
+            session = (session + rng.randrange(1, 1 << 24)) & 0xFFFFFF
+            seq = rng.randrange(65536)
+            # A reboot outlasts the reorder spread: frames the old session
+            # had in flight arrive first, bar the late copies below
+            slot = max(p[0] for p in packets) + 1 if packets else slot
+        seq = (seq + 1) & 0xFFFF
+        sent.append((session, seq))
+        for _ in range(rng.choice((1, 1, 2, 3))):
+            packets.append((slot + rng.randint(0, reorder), session, seq))
+            slot += 1
+        if len(sent) > transport.WINDOW and rng.random() < 0.05:
+            # A copy held up somewhere far longer than a retry interval
+            old = sent[rng.randrange(len(sent) - transport.WINDOW)]
+            packets.append((slot + reorder + 1, old[0], old[1]))
+
+    runs = {}
+    for _, s, q in sorted(packets, key=lambda p: p[0]):
+        if dedup.accept("peer", s, q):
+            runs[(s, q)] = runs.get((s, q), 0) + 1
+
+    for key in sent:
+        if runs.get(key, 0) != 1:
+            return f"session {key[0]} seq {key[1]} ran {runs.get(key, 0)} times"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--commands", type=int, default=300)
+    parser.add_argument("--reorder", type=int, default=transport.WINDOW // 3, help="max places a delivery moves")
+    args = parser.parse_args()
+
+    failures = 0
+    for problem in regression():
+        failures += 1
+        print(f"regression: {problem}")
+
+    rng = random.Random(args.seed)
+    for number in range(args.trials):
+        problem = trial(rng, args.commands, args.reorder)
+        if problem:
+            failures += 1
+            print(f"trial {number}: {problem}")
+    print(f"{args.trials} trials, {failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
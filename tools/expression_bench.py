@@ -0,0 +1,86 @@
+"""Expression pedal pipeline benchmark, runs on the Core itself.
+
+Started from the host with mpremote (the Core's files must be on the
+device, the MIDI output may stay connected):
+
+    mpremote run tools/expression_bench.py
+
+Feeds the pipeline synthetic pedal movements instead of the ADC: a full
+sweep per second and a pedal at rest with ADC noise. For each sample rate
+it reports the MIDI bytes per second sent on the UART, the CC values held
+back while the UART was busy, and the CPU share of the sampling ticks.
+"""
+import random
+import time
+import metrics
+from expression import ExpressionPedals
+from midi import Midi
+
+RATES_HZ = (50, 100, 200, 500, 1000)
+INPUTS = 2
+SECONDS = 3
+
+
+class Sweep:
+    """Pedal rocked heel to toe and back once per second, with ADC noise."""
+
+    def __init__(self, phase_ms=0):
+        self.phase_ms = phase_ms
+
+    def read_u16(self):
+        t = (time.ticks_ms() + self.phase_ms) % 1000
+        level = t * 131 if t < 500 else (1000 - t) * 131
+        return min(max(level + random.getrandbits(9) - 256, 0), 65535)
+
+
+class Resting:
+    """Pedal left alone, only ADC noise."""
+
+    def __init__(self, level=30000):
+        self.level = level
+
+    def read_u16(self):
+        return self.level + random.getrandbits(9) - 256
+
+
+def run(rate_hz, source, midi):
+    cfg = {
+        "rate_hz": rate_hz,
+        "inputs": [{"name": f"exp{i}", "pin": 26 + i, "channel": 1, "cc": 11 + i} for i in range(INPUTS)],
+    }
+    pedals = ExpressionPedals(cfg, midi, lambda: None)
+    for i, pedal in enumerate(pedals.inputs):
+        pedal.adc = source(i)
+
+    metrics.reset()
+    period_us = 1000000 // rate_hz
+    busy_us = 0
+    start = time.ticks_us()
+    deadline = start
+    while time.ticks_diff(time.ticks_us(), start) < SECONDS * 1000000:
+        t0 = time.ticks_us()
+        pedals.tick()
+        busy_us += time.ticks_diff(time.ticks_us(), t0)
+        deadline = time.ticks_add(deadline, period_us)
+        while time.ticks_diff(deadline, time.ticks_us()) > 0:
+            pass
+    elapsed_us = time.ticks_diff(time.ticks_us(), start)
+
+    midi_bytes = metrics._counters[metrics.MIDI_BYTES]
+    print(
+        f"{rate_hz:5d} Hz  {midi_bytes * 1000000 // elapsed_us:5d} B/s  "
+        f"held {pedals.held:5d}  cpu {busy_us * 100 / elapsed_us:5.1f}%"
+    )
+
+
+def main():
+    metrics.enable(True)
+    midi = Midi()
+    print(f"{INPUTS} inputs, {SECONDS} s per run, MIDI UART capacity 3125 B/s")
+    for name, source in (("sweep", lambda i: Sweep(i * 250)), ("resting", lambda i: Resting())):
+        print(name)
+        for rate_hz in RATES_HZ:
+            run(rate_hz, source, midi)
+
+
+main()
@@ -0,0 +1,72 @@
+"""Per-module import time and heap report, runs on the Core itself.
+
+Modules are imported leaf first, so each line is the cost of that module
+alone. Run it on a freshly reset board, once with the plain sources on it
+and once after uploading build/device, to compare before and after:
+
+    mpremote soft-reset run tools/import_report.py
+
+Importing the top modules runs nothing: the server is only created by
+main.py.
+"""
+import gc
+import sys
+import time
+
+# Dependency order, leaves first
+MODULES = (
+    "typing",
+    "logger",
+    "metrics",
+    "memory",
+    "file",
+    "midi",
+    "loop",
+    "footswitch",
+    "journal",
+    "clock",
+    "patch",
+    "bank_manager",
+    "bank_cache",
+    "sync",
+    "transport",
+    "http_parser",
+    "admission",
+    "sequencer",
+    "async_web_server",
+    # optional, imported only when configured
+    "pins",
+    "routing",
+    "expression",
+    "lib_lcd1602_2004_with_i2c",
+    "display",
+    "ble_server",
+    "recorder",
+)
+
+
+def main():
+    total_us = 0
+    total_bytes = 0
+    print(f"{'module':28} {'ms':>8} {'heap B':>8}  source")
+    for name in MODULES:
+        if name in sys.modules:
+            continue
+        gc.collect()
+        before = gc.mem_alloc()
+        t0 = time.ticks_us()
+        try:
+            module = __import__(name)
+        except ImportError as e:
+            print(f"{name:28} {'-':>8} {'-':>8}  {e}")
+            continue
+        elapsed = time.ticks_diff(time.ticks_us(), t0)
+        allocated = gc.mem_alloc() - before
+        total_us += elapsed
+        total_bytes += allocated
+        source = getattr(module, "__file__", "frozen")
+        print(f"{name:28} {elapsed / 1000:8.1f} {allocated:8d}  {source}")
+    print(f"{'total':28} {total_us / 1000:8.1f} {total_bytes:8d}")
+
+
+main()
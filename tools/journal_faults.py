@@ -0,0 +1,112 @@
+"""Host fault-injection test of the state journal.
+
+Runs journal.py on CPython (3.8+) over an in-memory file system. Each trial
+saves a random number of states, then cuts the power at a random byte of a
+following save (a torn append, or a rotation that truncated the next file
+but did not finish its snapshot) and boots a new StateStore from what is
+left. Recovery must return the last completed state, or the interrupted one
+if its record made it out whole:
+
+    python tools/journal_faults.py --trials 500
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import journal  # noqa: E402
+
+
+class PowerLoss(Exception):
+    pass
+
+
+class MemoryFS:
+    def __init__(self):
+        self.files = {}
+        self.budget = None  # bytes that still reach flash before the cut
+
+    def open(self, name, mode="r"):
+        if "w" in mode:
+            self.files[name] = bytearray()
+        elif name not in self.files:
+            if "r" in mode:
+                raise OSError(2, "ENOENT")
+            self.files[name] = bytearray()
+        return MemoryFile(self, name)
+
+
+class MemoryFile:
+    def __init__(self, fs, name):
+        self.fs = fs
+        self.data = fs.files[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def read(self, size=-1):
+        return bytes(self.data if size < 0 else self.data[:size])
+
+    def write(self, chunk):
+        if self.fs.budget is not None:
+            if len(chunk) > self.fs.budget:
+                self.data.extend(chunk[:self.fs.budget])
+                self.fs.budget = 0
+                raise PowerLoss()
+            self.fs.budget -= len(chunk)
+        self.data.extend(chunk)
+        return len(chunk)
+
+
+def trial(rng, max_file_bytes):
+    fs = MemoryFS()
+    journal.open = fs.open
+    store = journal.StateStore("state", legacy_file="missing.json", max_file_bytes=max_file_bytes)
+
+    committed = dict(store.data)
+    for _ in range(rng.randint(0, 120)):
+        store.save_to_file("active_patch_index", rng.randint(0, 7))
+        committed = dict(store.data)
+
+    store.set("active_bank_index", rng.randint(0, 20))
+    attempted = dict(store.data)
+    fs.budget = rng.randint(0, journal.MAX_RECORD_BYTES)
+    try:
+        store.save()
+        cut = False
+    except PowerLoss:
+        cut = True
+    fs.budget = None
+
+    recovered = journal.StateStore("state", legacy_file="missing.json", max_file_bytes=max_file_bytes).data
+    if recovered == attempted or (cut and recovered == committed):
+        return None
+    return f"recovered {recovered}, committed {committed}, attempted {attempted}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    # Small files so the trials cover rotations too
+    parser.add_argument("--max-file-bytes", type=int, default=256)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    for number in range(args.trials):
+        problem = trial(rng, args.max_file_bytes)
+        if problem:
+            failures += 1
+            print(f"trial {number}: {problem}")
+    print(f"{args.trials} trials, {failures} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,150 @@
+"""Host-side load generator for the Core's web server.
+
+Runs on a laptop (CPython 3.8+) joined to the Core's access point. It opens
+SSE subscribers that reconnect in a loop, hammers the page and stray paths,
+and meanwhile sends patch changes over UDP and HTTP, checking through SSE
+that every one of them was applied.
+
+    python tools/loadgen.py 192.168.4.1 --sse 8 --pages 4 --seconds 30
+"""
+import argparse
+import asyncio
+import json
+import socket
+import time
+
+UDP_PORT = 5005
+
+
+class Stats:
+    def __init__(self):
+        self.status = {}
+        self.errors = 0
+        self.command_latency_ms = []
+        self.commands_sent = 0
+        self.commands_seen = 0
+
+    def count(self, status):
+        self.status[status] = self.status.get(status, 0) + 1
+
+
+async def http_request(host, method, path, body=b"", timeout=5.0):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, 80), timeout)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n"
+        writer.write(head.encode() + body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def sse_churn(host, stats, stop, hold_s):
+    """Subscribe, read for a while, then drop the socket without closing it."""
+    while time.monotonic() < stop:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, 80), 5)
+            writer.write(f"GET /events HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), 5)
+            stats.count(int(status_line.split()[1]))
+            await asyncio.sleep(hold_s)
+            writer.transport.abort()
+        except Exception:
+            stats.errors += 1
+            await asyncio.sleep(0.2)
+
+
+async def page_load(host, stats, stop):
+    paths = ("/", "/favicon.ico", "/metrics", "/nope")
+    i = 0
+    while time.monotonic() < stop:
+        try:
+            stats.count(await http_request(host, "GET", paths[i % len(paths)]))
+        except Exception:
+            stats.errors += 1
+        i += 1
+
+
+async def watch_state(host, state, stop):
+    """Track the active patch index through one long-lived SSE connection."""
+    while time.monotonic() < stop:
+        try:
+            reader, writer = await asyncio.open_connection(host, 80)
+            writer.write(f"GET /events HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            while time.monotonic() < stop:
+                line = await asyncio.wait_for(reader.readline(), 5)
+                if not line:
+                    break  # evicted by the Core, subscribe again
+                if line.startswith(b"data: "):
+                    data = json.loads(line[6:])
+                    state["patch_index"] = data.get("patch_index")
+                    state["patch_count"] = len(data.get("patch_names", []))
+        except Exception:
+            await asyncio.sleep(0.5)
+
+
+async def commands(host, stats, state, stop, period_s, use_udp):
+    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    n = 0
+    while time.monotonic() < stop:
+        count = state.get("patch_count") or 1
+        target = n % count
+        n += 1
+        t0 = time.monotonic()
+        try:
+            if use_udp:
+                udp.sendto(bytes([0x03, target]), (host, UDP_PORT))
+            else:
+                stats.count(await http_request(host, "POST", "/", f"patch={target + 1}".encode()))
+            stats.commands_sent += 1
+            # SSE ticks every 500 ms, give the command two ticks to show up
+            while time.monotonic() - t0 < 1.2:
+                if state.get("patch_index") == target:
+                    stats.commands_seen += 1
+                    stats.command_latency_ms.append((time.monotonic() - t0) * 1000)
+                    break
+                await asyncio.sleep(0.01)
+        except Exception:
+            stats.errors += 1
+        await asyncio.sleep(period_s)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def main(args):
+    stats = Stats()
+    state = {}
+    stop = time.monotonic() + args.seconds
+    tasks = [watch_state(args.host, state, stop)]
+    tasks += [sse_churn(args.host, stats, stop, args.sse_hold) for _ in range(args.sse)]
+    tasks += [page_load(args.host, stats, stop) for _ in range(args.pages)]
+    tasks.append(commands(args.host, stats, state, stop, args.command_period, not args.http_commands))
+    await asyncio.gather(*tasks)
+
+    lat = stats.command_latency_ms
+    print(f"HTTP status counts: {dict(sorted(stats.status.items()))}")
+    print(f"Connection errors:  {stats.errors}")
+    print(f"Commands applied:   {stats.commands_seen}/{stats.commands_sent}")
+    print(f"Command visible in: p50 {percentile(lat, 50):.0f} ms, "
+          f"p95 {percentile(lat, 95):.0f} ms, max {max(lat) if lat else 0:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("host")
+    parser.add_argument("--sse", type=int, default=8, help="reconnecting SSE subscribers")
+    parser.add_argument("--sse-hold", type=float, default=1.0, help="seconds each SSE subscriber stays")
+    parser.add_argument("--pages", type=int, default=4, help="concurrent page/stray-path loaders")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--command-period", type=float, default=0.5)
+    parser.add_argument("--http-commands", action="store_true", help="send patch changes over HTTP instead of UDP")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""Reference client for the framed command transport, with simulated loss.
+
+Runs on a laptop (CPython 3.8+) joined to the Core's access point. It sends
+framed commands the way the FootProxy should: one seq per command, resent
+every --retry-ms until the ack arrives. Outgoing frames and incoming acks
+are dropped with probability --loss, so retransmits and duplicates happen
+on purpose. At the end the bank index reported by the Core must have moved
+by exactly the number of bank-up commands sent.
+
+    python tools/lossy_client.py 192.168.4.1 --commands 50 --loss 0.3
+"""
+import argparse
+import random
+import socket
+import struct
+import time
+
+UDP_PORT = 5005
+FRAME_V1 = 0x81
+ACK_V1 = 0x82
+ACK_NAMES = {0: "ok", 1: "duplicate", 2: "error"}
+BANK_UP = b"\x01"
+
+
+class ReliableClient:
+    def __init__(self, host, loss=0.0, retry_ms=30, attempts=20):
+        self.addr = (host, UDP_PORT)
+        self.loss = loss
+        self.retry_s = retry_ms / 1000
+        self.attempts = attempts
+        self.session = random.randrange(1 << 24)
+        self.seq = random.randrange(65536)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sent = 0
+        self.dropped = 0
+        self.acks = {}
+
+    def _lost(self):
+        if random.random() < self.loss:
+            self.dropped += 1
+            return True
+        return False
+
+    def send(self, command: bytes):
+        """Send until acknowledged, returns (status, bank, patch, latency_ms)."""
+        self.seq = (self.seq + 1) & 0xFFFF
+        frame = struct.pack("<BHBH", FRAME_V1, self.session & 0xFFFF, self.session >> 16, self.seq) + command
+        start = time.monotonic()
+        for _ in range(self.attempts):
+            self.sent += 1
+            if not self._lost():
+                self.sock.sendto(frame, self.addr)
+            deadline = time.monotonic() + self.retry_s
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.sock.settimeout(remaining)
+                try:
+                    data, _ = self.sock.recvfrom(64)
+                except socket.timeout:
+                    break
+                if len(data) < 9 or data[0] != ACK_V1 or self._lost():
+                    continue
+                _, low, high, seq, status, bank, patch = struct.unpack_from("<BHBHBBB", data)
+                if low | (high << 16) == self.session and seq == self.seq:
+                    name = ACK_NAMES.get(status, status)
+                    self.acks[name] = self.acks.get(name, 0) + 1
+                    return status, bank, patch, (time.monotonic() - start) * 1000
+        raise TimeoutError(f"no ack for seq {self.seq}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("host")
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--loss", type=float, default=0.3, help="drop probability per datagram, both ways")
+    parser.add_argument("--retry-ms", type=int, default=30)
+    parser.add_argument("--banks", type=int, required=True, help="number of banks in the Core's config")
+    args = parser.parse_args()
+
+    client = ReliableClient(args.host, args.loss, args.retry_ms)
+    # A lossless command first, to learn the starting bank
+    status, first_bank, _, _ = ReliableClient(args.host).send(BANK_UP)
+    latencies = []
+    bank = first_bank
+    for _ in range(args.commands):
+        status, bank, _, latency = client.send(BANK_UP)
+        latencies.append(latency)
+
+    expected = (first_bank + args.commands) % args.banks
+    latencies.sort()
+    print(f"datagrams sent {client.sent}, dropped {client.dropped}, acks {client.acks}")
+    print(f"latency ms p50 {latencies[len(latencies) // 2]:.1f} max {latencies[-1]:.1f}")
+    print(f"bank {bank}, expected {expected}: {'OK' if bank == expected else 'MISMATCH'}")
+    return 0 if bank == expected else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,243 @@
+"""Replay a recorded gig against a Core and compare runs.
+
+Runs on a laptop (CPython 3.8+) joined to the Core's access point. Copy the
+recording off the board first (it needs "record_commands" in the Core's
+network_config.json):
+
+    mpremote cp :commands.rec gig.rec
+    python tools/replay.py run gig.rec 192.168.4.1 --speed 1 --json old.json
+    python tools/replay.py run gig.rec 192.168.4.1 --speed 0 --json new.json
+    python tools/replay.py compare old.json new.json
+
+--speed 1 keeps the recorded timing, 0 sends each command as soon as the
+previous one was answered. UDP and BLE commands are sent as framed UDP
+commands so every one is acknowledged (the host has no BLE link), all in
+one session of the replay's own; a recorded retransmit reuses the seq of
+its first send, so it is a duplicate again. HTTP commands are posted to /
+like the web UI does. Put the Core back in the same bank and patch as at
+the start of the recording before comparing runs.
+"""
+import argparse
+import json
+import random
+import socket
+import struct
+import time
+import urllib.request
+
+UDP_PORT = 5005
+RECORD_SIZE = 24
+HEADER = "<IIBB"
+HEADER_SIZE = 10
+
+SOURCE_NAMES = {0: "udp", 1: "ble", 2: "http"}
+SOURCE_BOOT = 0xFF
+
+FRAME_V1 = 0x81
+FRAME_HEADER_SIZE = 6
+ACK_V1 = 0x82
+ACK_ERROR = 2
+# Unknown command, answered with an error ack carrying the current state
+PROBE = b"\x00"
+
+
+def read_log(path):
+    """Return the sessions of a recording, oldest first, as lists of
+    (time_ms, source, data)."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    records = []
+    for offset in range(0, len(raw) - RECORD_SIZE + 1, RECORD_SIZE):
+        seq, time_ms, source, length = struct.unpack_from(HEADER, raw, offset)
+        if seq and length <= RECORD_SIZE - HEADER_SIZE:
+            data = raw[offset + HEADER_SIZE:offset + HEADER_SIZE + length]
+            records.append((seq, time_ms, source, data))
+    records.sort()
+
+    sessions = []
+    for _, time_ms, source, data in records:
+        if source == SOURCE_BOOT or not sessions:
+            sessions.append([])
+        if source != SOURCE_BOOT:
+            sessions[-1].append((time_ms, source, data))
+    return [session for session in sessions if session]
+
+
+class Target:
+    def __init__(self, host, timeout_ms=50, attempts=10):
+        self.host = host
+        self.timeout_s = timeout_ms / 1000
+        self.attempts = attempts
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.session = random.randrange(1 << 24)
+        self.seq = random.randrange(65536)
+        # (recorded session, recorded seq) -> seq sent for it
+        self.seqs = {}
+        self.state = None
+
+    def send_udp(self, data):
+        """Send a command framed, returns the ack status or None on timeout."""
+        if len(data) >= FRAME_HEADER_SIZE + 1 and data[0] == FRAME_V1:
+            # Recorded frame: same command, this replay's session. A
+            # retransmit reuses the seq of its first send
+            recorded = (data[1] | (data[2] << 8) | (data[3] << 16), data[4] | (data[5] << 8))
+            seq = self.seqs.get(recorded)
+            if seq is None:
+                seq = self.seqs[recorded] = self._next_seq()
+            command = bytes(data[FRAME_HEADER_SIZE:])
+        else:
+            seq = self._next_seq()
+            command = bytes(data)
+        session = self.session
+        frame = struct.pack("<BHBH", FRAME_V1, session & 0xFFFF, session >> 16, seq) + command
+
+        for _ in range(self.attempts):
+            self.sock.sendto(frame, (self.host, UDP_PORT))
+            deadline = time.monotonic() + self.timeout_s
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.sock.settimeout(remaining)
+                try:
+                    reply, _ = self.sock.recvfrom(64)
+                except socket.timeout:
+                    break
+                if len(reply) >= 9 and reply[0] == ACK_V1:
+                    _, low, high, ack_seq, status, bank, patch = struct.unpack_from("<BHBHBBB", reply)
+                    if (low | (high << 16), ack_seq) == (session, seq):
+                        self.state = (bank, patch)
+                        return status
+        return None
+
+    def _next_seq(self):
+        self.seq = (self.seq + 1) & 0xFFFF
+        return self.seq
+
+    def send_http(self, data):
+        request = urllib.request.Request(f"http://{self.host}/", data=bytes(data), method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+                return 0 if response.status == 200 else ACK_ERROR
+        except OSError:
+            return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def replay(session, target, speed):
+    latencies = {"udp": [], "ble": [], "http": []}
+    errors = 0
+    timeouts = 0
+    late = 0
+    start = time.monotonic()
+    first_ms = session[0][0]
+
+    for time_ms, source, data in session:
+        if speed > 0:
+            due = start + (time_ms - first_ms) / 1000 / speed
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            elif wait < -0.05:
+                late += 1
+
+        name = SOURCE_NAMES.get(source, "udp")
+        t0 = time.monotonic()
+        status = target.send_http(data) if name == "http" else target.send_udp(data)
+        elapsed_ms = (time.monotonic() - t0) * 1000
+        if status is None:
+            timeouts += 1
+        elif status == ACK_ERROR:
+            errors += 1
+        else:
+            latencies[name].append(elapsed_ms)
+
+    duration = time.monotonic() - start
+    target.send_udp(PROBE)
+
+    report = {
+        "commands": len(session),
+        "duration_s": round(duration, 3),
+        "throughput_cps": round(len(session) / duration, 1) if duration else 0,
+        "errors": errors,
+        "timeouts": timeouts,
+        "late": late,
+        "final_state": {"bank": target.state[0], "patch": target.state[1]} if target.state else None,
+        "latency_ms": {},
+    }
+    for name, values in latencies.items():
+        if values:
+            values.sort()
+            report["latency_ms"][name] = {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5), 2),
+                "p90": round(percentile(values, 0.9), 2),
+                "p99": round(percentile(values, 0.99), 2),
+                "max": round(values[-1], 2),
+            }
+    return report
+
+
+def print_report(report):
+    print(f"commands {report['commands']} in {report['duration_s']} s, {report['throughput_cps']} per second")
+    print(f"errors {report['errors']}, timeouts {report['timeouts']}, late {report['late']}")
+    for name, stats in report["latency_ms"].items():
+        print(f"  {name:5} n={stats['count']:5}  p50 {stats['p50']:7.2f}  p90 {stats['p90']:7.2f}  p99 {stats['p99']:7.2f}  max {stats['max']:7.2f} ms")
+    print(f"final state {report['final_state']}")
+
+
+def compare(a, b):
+    print(f"{'':22} {'A':>10} {'B':>10}")
+    for key in ("commands", "duration_s", "throughput_cps", "errors", "timeouts", "late"):
+        print(f"{key:22} {a[key]:>10} {b[key]:>10}")
+    for name in sorted(set(a["latency_ms"]) | set(b["latency_ms"])):
+        for stat in ("p50", "p90", "p99", "max"):
+            left = a["latency_ms"].get(name, {}).get(stat, "-")
+            right = b["latency_ms"].get(name, {}).get(stat, "-")
+            print(f"{name + ' ' + stat + ' ms':22} {left:>10} {right:>10}")
+    same = a["final_state"] == b["final_state"]
+    print(f"final state A {a['final_state']}, B {b['final_state']}: {'same' if same else 'DIFFERENT'}")
+    return 0 if same else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="replay a recording against a Core")
+    run.add_argument("log")
+    run.add_argument("host")
+    run.add_argument("--speed", type=float, default=1.0, help="1 = recorded timing, 0 = as fast as possible")
+    run.add_argument("--session", type=int, default=-1, help="session to replay, -1 = the last one with commands")
+    run.add_argument("--json", help="also write the report to this file")
+
+    diff = commands.add_parser("compare", help="compare two replay reports")
+    diff.add_argument("a")
+    diff.add_argument("b")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.a) as fa, open(args.b) as fb:
+            return compare(json.load(fa), json.load(fb))
+
+    sessions = read_log(args.log)
+    if not sessions:
+        print("No commands recorded")
+        return 1
+    print(f"{len(sessions)} sessions, replaying {args.session} ({len(sessions[args.session])} commands)")
+    report = replay(sessions[args.session], Target(args.host), args.speed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+import struct
+import logger as log
+
+# Framed command transport, used over UDP and BLE next to the original
+# single-byte commands.
+#
+#   request: 0x81 session:u24 seq:u16 command...
+#   ack:     0x82 session:u24 seq:u16 status:u8 bank:u8 patch:u8
+#
+# The sender picks a random session at boot and increments seq per command
+# (wrapping at 65536). A retransmitted frame carries the same seq, so it is
+# acknowledged again with the current state but not executed twice; this
+# lets the FootProxy retry aggressively without double-advancing banks.
+# A sender reboot is only recognised by its new session, 24 bits make
+# drawing the old one again a 1 in 16M event; late frames of the session
+# before the reboot are stale. So is a frame more than WINDOW behind the
+# newest one: both are acknowledged as duplicates without running them. Unframed packets keep working as before
+# and get no ack.
+
+FRAME_V1 = 0x81
+ACK_V1 = 0x82
+
+ACK_OK = 0
+ACK_DUPLICATE = 1
+ACK_ERROR = 2
+
+NO_PATCH = 0xFF
+
+# 24 bits keep the window mask and the session small ints on MicroPython
+# (no heap use)
+WINDOW = 24
+_WINDOW_MASK = (1 << WINDOW) - 1
+MAX_SENDERS = 8
+
+
+def parse(data):
+    """Returns (session, seq, command) of a framed packet, None otherwise."""
+    if len(data) < 7 or data[0] != FRAME_V1:
+        return None
+    return data[1] | (data[2] << 8) | (data[3] << 16), data[4] | (data[5] << 8), data[6:]
+
+
+def ack(session: int, seq: int, status: int, bank: int, patch: int) -> bytes:
+    return struct.pack("<BHBHBBB", ACK_V1, session & 0xFFFF, session >> 16, seq, status, bank & 0xFF, patch & 0xFF)
+
+
+class _Window:
+    __slots__ = ("session", "previous", "highest", "mask")
+
+    def __init__(self, session: int, seq: int, previous: int = -1):
+        self.session = session
+        # Session before the sender's last reboot, its late frames are stale
+        self.previous = previous
+        self.highest = seq
+        self.mask = 1  # bit i set: highest - i was seen
+
+
+class Deduplicator:
+    """Per-sender sliding window of the last WINDOW sequence numbers."""
+
+    def __init__(self, max_senders: int = MAX_SENDERS):
+        self.max_senders = max_senders
+        self.windows = {}
+        self.duplicates = 0
+        self.stale = 0
+
+    def accept(self, peer, session: int, seq: int) -> bool:
+        """True if (session, seq) is new for peer and should be executed."""
+        window = self.windows.get(peer)
+        if window is None:
+            if len(self.windows) >= self.max_senders:
+                del self.windows[next(iter(self.windows))]
+            self.windows[peer] = _Window(session, seq)
+            return True
+
+        if window.session != session:
+            if session == window.previous:
+                # In flight when the sender rebooted, must not switch back
+                self.stale += 1
+                return False
+            # The sender restarted
+            self.windows[peer] = _Window(session, seq, window.session)
+            return True
+
+        ahead = (seq - window.highest) & 0xFFFF
+        if ahead != 0 and ahead < 0x8000:
+            if ahead < WINDOW:
+                window.mask = ((window.mask << ahead) | 1) & _WINDOW_MASK
+            else:
+                window.mask = 1
+            window.highest = seq
+            return True
+
+        behind = (window.highest - seq) & 0xFFFF
+        if behind >= WINDOW:
+            # Older than anything the window remembers, it may have run:
+            # a late retransmit is answered, never executed
+            self.stale += 1
+            log.debug("Stale frame", seq, "from", peer)
+            return False
+
+        if not window.mask & (1 << behind):
+            window.mask |= 1 << behind
+            return True
+
+        # Seen already: never execute it twice
+        self.duplicates += 1
+        log.debug("Duplicate frame", seq, "from", peer)
+        return False
+
+    def render(self) -> str:
+        """Duplicate count appended to the /metrics output."""
+        return (
+            f"command_duplicate_frames_total {self.duplicates}\n"
+            f"command_stale_frames_total {self.stale}\n"
+            f"command_senders {len(self.windows)}\n"
+        )